@@ -1,3 +1,7 @@
 from .bottica import Bottica
 from . import verification
 from ua_parser import user_agent_parser
+from .engine import ShardedVerifier, Verdict
+from .follow import LogFollower
+from .spoofers import SpooferTracker
+from .cache import LRUCache, VerdictCache
@@ -0,0 +1,221 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = pc = pq = None
+
+from bottica.bottica import Bottica
+from bottica.cache import LRUCache
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError(
+            "Columnar verification requires pyarrow, "
+            "install it with `pip install bottica[arrow]`"
+        )
+
+
+def verify_batch(
+    bottica: Bottica,
+    batch: "pa.RecordBatch",
+    ip_column: str = "ip",
+    ua_column: str = "user_agent",
+    bot_column: str = "bot",
+    verified_column: str = "verified",
+    cache: Optional[LRUCache] = None,
+    executor: Optional[ThreadPoolExecutor] = None,
+) -> "pa.RecordBatch":
+    """
+    Verify the IP and User-Agent columns of an Arrow record batch.
+
+    The User-Agents are dictionary-encoded, so every distinct User-Agent
+    in the batch is parsed only once, and every distinct (ip, bot) pair
+    is verified only once. Two columns are appended to the batch: the
+    parsed bot name (dictionary-encoded), and whether it was verified.
+    The verified column is null for rows whose bot has no verifiers,
+    without User-Agent, or whose verification failed with an error (e.g.
+    a malformed IP, or a DNS failure).
+
+    :param Bottica bottica: The Bottica instance to verify with
+    :param pa.RecordBatch batch: The batch to verify
+    :param str ip_column: The name of the IP column
+    :param str ua_column: The name of the User-Agent column
+    :param str bot_column: The name of the bot name column to add
+    :param str verified_column: The name of the verified column to add
+    :param cache: An optional cache of verdicts, keyed by (ip, botname),
+        to reuse across batches
+    :param ThreadPoolExecutor executor: An optional executor to verify
+        the distinct pairs of the batch concurrently
+    :return: The batch with the bot and verified columns
+    """
+    _require_pyarrow()
+
+    uas = batch.column(ua_column)
+    if not pa.types.is_dictionary(uas.type):
+        uas = pc.dictionary_encode(uas)
+
+    botnames = [
+        None if ua is None else bottica.parse_ua(ua)
+        for ua in uas.dictionary.to_pylist()
+    ]
+    bots = pa.DictionaryArray.from_arrays(uas.indices, pa.array(botnames, pa.string()))
+
+    # Only rows claiming to be a bot with verifiers need any more work
+    known = [i for i, name in enumerate(botnames) if name in bottica.verifiers]
+    ips = batch.column(ip_column)
+    mask = pc.and_(
+        pc.fill_null(pc.is_in(uas.indices, pa.array(known, uas.indices.type)), False),
+        pc.is_valid(ips),
+    )
+    positions = pa.array(range(len(batch)), pa.int64()).filter(mask).to_pylist()
+    pairs = list(
+        zip(
+            ips.filter(mask).to_pylist(),
+            (botnames[i] for i in uas.indices.filter(mask).to_pylist()),
+        )
+    )
+
+    verdicts = {}
+    todo = []
+    for pair in dict.fromkeys(pairs):
+        cached = cache.get(pair) if cache is not None else None
+        if cached is None:
+            todo.append(pair)
+        else:
+            verdicts[pair] = cached
+
+    def verify(pair):
+        try:
+            return bottica.verify_bot(*pair)
+        except (OSError, ValueError):
+            return None
+
+    results = executor.map(verify, todo) if executor else map(verify, todo)
+    for pair, verified in zip(todo, results):
+        verdicts[pair] = verified
+        if cache is not None and verified is not None:
+            cache.put(pair, verified)
+
+    verified: List[Optional[bool]] = [None] * len(batch)
+    for position, pair in zip(positions, pairs):
+        verified[position] = verdicts[pair]
+
+    return pa.RecordBatch.from_arrays(
+        batch.columns + [bots, pa.array(verified, pa.bool_())],
+        names=batch.schema.names + [bot_column, verified_column],
+    )
+
+
+def verify_batches(
+    bottica: Bottica,
+    batches: "Iterator[pa.RecordBatch]",
+    cache_size: int = 2**16,
+    max_workers: int = 16,
+    **kwargs
+) -> "Iterator[pa.RecordBatch]":
+    """
+    Verify a stream of Arrow record batches.
+
+    Verdicts are cached across batches. See `verify_batch()` for the
+    column arguments.
+
+    :param Bottica bottica: The Bottica instance to verify with
+    :param Iterator[pa.RecordBatch] batches: The batches to verify
+    :param int cache_size: The maximum number of verdicts to cache
+    :param int max_workers: The maximum number of concurrent verifications
+    :return: The verified batches
+    """
+    _require_pyarrow()
+    cache = LRUCache(cache_size)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch in batches:
+            yield verify_batch(bottica, batch, cache=cache, executor=executor, **kwargs)
+
+
+def verify_table(
+    bottica: Bottica, table: "pa.Table", batch_size: Optional[int] = None, **kwargs
+) -> "pa.Table":
+    """
+    Verify an Arrow table.
+
+    :param Bottica bottica: The Bottica instance to verify with
+    :param pa.Table table: The table to verify
+    :param int batch_size: The maximum number of rows per batch
+    :param kwargs: Additional arguments for `verify_batches()`
+    :return: The table with the bot and verified columns
+    """
+    _require_pyarrow()
+    batches = table.to_batches(max_chunksize=batch_size)
+    if not batches:
+        # Still verify an empty batch, to get the output schema
+        schema = table.schema
+        batches = [
+            pa.RecordBatch.from_arrays(
+                [pa.array([], field.type) for field in schema], schema=schema
+            )
+        ]
+    return pa.Table.from_batches(list(verify_batches(bottica, batches, **kwargs)))
+
+
+def verify_parquet(
+    bottica: Bottica,
+    source: Union[Path, str],
+    destination: Union[Path, str],
+    columns: Optional[List[str]] = None,
+    batch_size: int = 2**16,
+    **kwargs
+) -> None:
+    """
+    Verify a Parquet file, writing the result to another Parquet file.
+
+    The source is read in record batches, so files larger than memory
+    can be verified. The result is written to a temporary file next to
+    `destination`, which is only replaced once all batches succeeded.
+
+    Example:
+    >>> verify_parquet(Bottica(), "access_logs.parquet", "verified.parquet")
+
+    :param Bottica bottica: The Bottica instance to verify with
+    :param source: The Parquet file to verify
+    :param destination: The Parquet file to write
+    :param List[str] columns: The columns to read (and write). Must
+        include the IP and User-Agent columns. Defaults to all columns.
+    :param int batch_size: The maximum number of rows per batch
+    :param kwargs: Additional arguments for `verify_batches()`
+    """
+    _require_pyarrow()
+    parquet_file = pq.ParquetFile(source)
+    batches = parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+
+    temp_path = "{}.{}.tmp".format(os.fspath(destination), os.getpid())
+
+    writer = None
+    try:
+        try:
+            for batch in verify_batches(bottica, batches, **kwargs):
+                if writer is None:
+                    writer = pq.ParquetWriter(temp_path, batch.schema)
+                writer.write_batch(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if writer is None:
+            # Empty source, still write a file with the right schema
+            table = parquet_file.schema_arrow.empty_table()
+            if columns is not None:
+                table = table.select(columns)
+            pq.write_table(verify_table(bottica, table, **kwargs), temp_path)
+
+        os.replace(temp_path, destination)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -1,9 +1,12 @@
 from pathlib import Path
-from typing import Union, List, Any
+from typing import Union, List, Any, Optional
 
 import yaml
 from ua_parser import user_agent_parser
 
+from bottica.cache import VerdictCache
+from bottica.scheduler import PRIORITY_INTERACTIVE
+from bottica.spoofers import SpooferTracker
 from bottica.verification import fcrdns_hosts, ip_list, ip_ranges, cidr_list
 
 
@@ -38,7 +41,12 @@ _load_uap_extras()
 
 class Bottica:
     def __init__(
-        self, yaml_path: Union[Path, str, None] = _bottica_yaml_path, max_tries: int = 3
+        self,
+        yaml_path: Union[Path, str, None] = _bottica_yaml_path,
+        max_tries: int = 3,
+        spoofers: Optional[SpooferTracker] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        cache: Optional[VerdictCache] = None,
     ):
         """
         Verify that bots are really who they say they are.
@@ -68,11 +76,25 @@ class Bottica:
         :param Union[Path, str] yaml_path: The path to `bottica.yaml`
         :param int max_tries: The maximum number of retries for network-
             dependent verification attempts.
+        :param SpooferTracker spoofers: An optional tracker of IPs that
+            failed verification. Failed IPs are recorded in it, and
+            requests from known spoofers fail immediately, before any
+            DNS lookups.
+        :param int priority: The scheduling priority of DNS lookups (see
+            `bottica.scheduler`). Use `PRIORITY_BULK` for instances that
+            do background work, like backfills, so that they don't slow
+            down interactive verification in the same process.
+        :param VerdictCache cache: An optional cache for the verdicts of
+            `verify_bot()`, which refreshes hot verdicts in the
+            background before they expire.
         """
         self.verifiers = dict()
         if yaml_path:
             self.load(yaml_path)
         self.max_tries = max_tries
+        self.spoofers = spoofers
+        self.priority = priority
+        self.cache = cache
 
     def load(self, yaml_path: Union[Path, str]) -> None:
         """
@@ -90,7 +112,6 @@ class Bottica:
         bot_dict = {bot.pop("name"): bot for bot in self.yaml["bots"]}
         self.verifiers.update(bot_dict)
 
-    # TODO: Add LRU cache with adjustable size
     def verify_bot(self, ip: str, botname: str) -> bool:
         """
         Verify a bot by name.
@@ -102,13 +123,25 @@ class Bottica:
         :return: Whether the bot's IP was successfully verified
         """
         bot_verifiers = self.verifiers[botname]
+        if self.spoofers is not None and self.spoofers.is_spoofer(ip):
+            return False
 
-        return all(
+        if self.cache is None:
+            return self._verify_bot(ip, botname, bot_verifiers)
+        return self.cache.get_or_verify(
+            (ip, botname), lambda: self._verify_bot(ip, botname, bot_verifiers)
+        )
+
+    def _verify_bot(self, ip: str, botname: str, bot_verifiers: dict) -> bool:
+        verified = all(
             (
                 self.verify(ip, verifier, values)
                 for verifier, values in bot_verifiers.items()
             )
         )
+        if not verified and self.spoofers is not None:
+            self.spoofers.record(ip, botname)
+        return verified
 
     @staticmethod
     def parse_ua(user_agent: str) -> str:
@@ -172,7 +205,12 @@ class Bottica:
         :return: Whether the IP successfully verified
         """
         if verifier == "fcrdns_hosts":
-            return fcrdns_hosts(ip, allowed_hosts=values, max_tries=self.max_tries)
+            return fcrdns_hosts(
+                ip,
+                allowed_hosts=values,
+                max_tries=self.max_tries,
+                priority=self.priority,
+            )
         elif verifier == "ip_list":
             return ip_list(ip, allowed_ips=values)
         elif verifier == "ip_ranges":
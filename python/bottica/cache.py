@@ -0,0 +1,216 @@
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """
+    A minimal least-recently-used mapping with a maximum size.
+
+    Unlike `VerdictCache`, entries never expire and aren't thread-safe,
+    which suits the caches of a single bulk verification pass.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def put(self, key: Any, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class _Entry:
+    __slots__ = ("verdict", "fetched_at", "hits", "refreshing")
+
+    def __init__(self, verdict: bool, fetched_at: float):
+        self.verdict = verdict
+        self.fetched_at = fetched_at
+        self.hits = 0
+        self.refreshing = False
+
+
+class VerdictCache:
+    def __init__(
+        self,
+        ttl: float = 60 * 60,
+        max_size: int = 2**16,
+        refresh_ahead: float = 0.8,
+        min_hits: int = 2,
+        stale_ttl: Optional[float] = None,
+        max_refreshes: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Cache verification verdicts, refreshing hot ones in the background.
+
+        Verdicts are cached for `ttl` seconds, for at most `max_size`
+        keys (evicting the least recently used). Verdicts that were hit
+        at least `min_hits` times since they were fetched are "hot":
+        once they're older than `refresh_ahead * ttl` they are verified
+        again in the background, while the old verdict keeps being
+        served until the new one lands (stale-while-revalidate). Hot
+        verdicts are even served up to `stale_ttl` seconds past their
+        expiry (retrying the refresh), so that hot keys never wait for
+        DNS. At most `max_refreshes` refreshes run at once; if a refresh
+        fails, the old verdict is kept until it's fully expired.
+
+        Example:
+        >>> btca = Bottica(cache=VerdictCache(ttl=3600))
+
+        :param float ttl: How long (in seconds) verdicts are fresh
+        :param int max_size: The maximum number of cached verdicts
+        :param float refresh_ahead: The fraction of the ttl after which
+            hot verdicts are refreshed
+        :param int min_hits: The number of hits that make a verdict hot
+        :param float stale_ttl: How long (in seconds) expired hot
+            verdicts may still be served. Defaults to the ttl.
+        :param int max_refreshes: The maximum number of concurrent
+            background refreshes
+        :param Callable clock: Returns the current time in seconds
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.refresh_ahead = refresh_ahead
+        self.min_hits = min_hits
+        self.stale_ttl = ttl if stale_ttl is None else stale_ttl
+        self.max_refreshes = max_refreshes
+        self.clock = clock
+        self._init_state()
+
+    def _init_state(self) -> None:
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = 0
+        # Started on the first refresh
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = os.getpid()
+        _caches.add(self)
+
+    def _after_fork(self) -> None:
+        # Only the forking thread survives in a child process: the refresh
+        # threads are gone, and the lock may be held by one of them. Keep
+        # the verdicts, but forget about the refreshes.
+        self._lock = threading.Lock()
+        self._refreshing = 0
+        self._executor = None
+        self._pid = os.getpid()
+        for entry in self._data.values():
+            entry.refreshing = False
+
+    def __getstate__(self) -> dict:
+        # Locks and threads can't be pickled (e.g. when a Bottica is sent
+        # to worker processes), so a copy starts out empty
+        state = self.__dict__.copy()
+        for attr in ("_data", "_lock", "_refreshing", "_executor"):
+            del state[attr]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._init_state()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _put(self, key: Hashable, verdict: bool, now: float) -> None:
+        self._data[key] = _Entry(verdict, now)
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def _maybe_refresh(
+        self, key: Hashable, entry: _Entry, verify: Callable[[], bool]
+    ) -> None:
+        if entry.refreshing or self._refreshing >= self.max_refreshes:
+            return
+        entry.refreshing = True
+        self._refreshing += 1
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_refreshes, thread_name_prefix="bottica-refresh"
+            )
+        self._executor.submit(self._refresh, key, entry, verify)
+
+    def _refresh(
+        self, key: Hashable, entry: _Entry, verify: Callable[[], bool]
+    ) -> None:
+        try:
+            verdict = verify()
+        except Exception:
+            verdict = None
+
+        with self._lock:
+            self._refreshing -= 1
+            entry.refreshing = False
+            if verdict is not None and self._data.get(key) is entry:
+                self._put(key, verdict, self.clock())
+
+    def get_or_verify(self, key: Hashable, verify: Callable[[], bool]) -> bool:
+        """
+        Get a cached verdict, verifying (and caching) it if needed.
+
+        :param Hashable key: The cache key, e.g. (ip, botname)
+        :param Callable verify: Performs the verification for the key
+        :return: The (cached) verdict
+        """
+        if self._pid != os.getpid():
+            # Without os.register_at_fork (Python < 3.7), detect forks here
+            self._after_fork()
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                now = self.clock()
+                age = now - entry.fetched_at
+                entry.hits += 1
+                hot = entry.hits >= self.min_hits
+
+                if age < self.ttl:
+                    self._data.move_to_end(key)
+                    if hot and age >= self.refresh_ahead * self.ttl:
+                        self._maybe_refresh(key, entry, verify)
+                    return entry.verdict
+
+                if hot and age < self.ttl + self.stale_ttl:
+                    self._data.move_to_end(key)
+                    self._maybe_refresh(key, entry, verify)
+                    return entry.verdict
+
+        verdict = verify()
+        with self._lock:
+            self._put(key, verdict, self.clock())
+        return verdict
+
+    def clear(self) -> None:
+        """Remove all cached verdicts."""
+        with self._lock:
+            self._data.clear()
+
+
+_caches: "weakref.WeakSet[VerdictCache]" = weakref.WeakSet()
+
+
+def _after_fork() -> None:
+    for cache in list(_caches):
+        cache._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
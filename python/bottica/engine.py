@@ -0,0 +1,268 @@
+import multiprocessing
+import os
+import pickle
+import queue
+import zlib
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from bottica.bottica import Bottica
+from bottica.cache import LRUCache
+
+# Seconds between worker liveness checks while waiting for results
+_POLL_INTERVAL = 0.5
+
+
+class Verdict(NamedTuple):
+    """
+    The outcome of verifying a single IP/User-Agent pair.
+
+    `verified` is None if the parsed bot name has no verifiers, i.e.
+    the User-Agent doesn't claim to be a bot known to Bottica, or if
+    the verification failed with an error (e.g. a malformed IP, or a
+    DNS failure). The two cases can be told apart by whether `botname`
+    is in `Bottica.verifiers`.
+    """
+
+    botname: str
+    verified: Optional[bool]
+
+
+def verify_row(
+    bottica: Bottica, ip: str, user_agent: str, cache: Optional[LRUCache] = None
+) -> Verdict:
+    """
+    Verify an IP/User-Agent pair, tolerating User-Agents of unknown bots.
+
+    Unlike `Bottica.verify_ua()`, this doesn't raise for User-Agents
+    that don't parse to a bot with verifiers (e.g. regular browsers),
+    for malformed IPs, or for network errors, but returns a verdict with
+    `verified=None` instead. Errors aren't cached.
+
+    :param Bottica bottica: The Bottica instance to verify with
+    :param str ip: The IP (v4 or v6) to verify
+    :param str user_agent: The User-Agent of the request
+    :param cache: An optional cache of previous verdicts, keyed by
+        (ip, botname)
+    :return: The parsed bot name and whether it was verified
+    """
+    botname = bottica.parse_ua(user_agent)
+    if botname not in bottica.verifiers:
+        return Verdict(botname, None)
+
+    key = (ip, botname)
+    verified = cache.get(key) if cache is not None else None
+    if verified is None:
+        try:
+            verified = bottica.verify_bot(ip, botname)
+        except (OSError, ValueError):
+            return Verdict(botname, None)
+        if cache is not None:
+            cache.put(key, verified)
+    return Verdict(botname, verified)
+
+
+def _shard(ip: str, n_shards: int) -> int:
+    """Stable assignment of an IP to one of `n_shards` shards."""
+    return zlib.crc32(ip.encode()) % n_shards
+
+
+def _worker(
+    bottica: Bottica,
+    cache_size: int,
+    in_queue: multiprocessing.Queue,
+    out_queue: multiprocessing.Queue,
+) -> None:
+    """
+    Verification worker loop.
+
+    Receives (seq, positions, rows) tasks until it gets None, and sends
+    back (seq, positions, verdicts), or (seq, None, exception) if the
+    verification failed.
+    """
+    cache = LRUCache(cache_size)
+    while True:
+        task = in_queue.get()
+        if task is None:
+            return
+        seq, positions, rows = task
+        try:
+            verdicts = [verify_row(bottica, ip, ua, cache) for ip, ua in rows]
+        except Exception as e:
+            try:
+                pickle.dumps(e)
+            except Exception:
+                # Unpicklable exceptions would get lost in the queue's
+                # feeder thread, and leave the parent waiting forever
+                e = RuntimeError(repr(e))
+            out_queue.put((seq, None, e))
+        else:
+            out_queue.put((seq, positions, verdicts))
+
+
+class ShardedVerifier:
+    def __init__(
+        self,
+        bottica: Optional[Bottica] = None,
+        processes: Optional[int] = None,
+        chunk_size: int = 1000,
+        cache_size: int = 2**16,
+        max_pending_chunks: Optional[int] = None,
+    ):
+        """
+        Verify large amounts of IP/User-Agent pairs on multiple cores.
+
+        Rows are partitioned over worker processes by a hash of their
+        IP, so each worker sees a disjoint set of IPs and keeps its own
+        cache of verdicts for them. Rows are sent to the workers in
+        chunks, and the verdicts are yielded in the original order.
+
+        The Bottica instance is sent to each worker on start, so changes
+        to it (e.g. new verifiers) after the first call to `verify()`
+        are only picked up after `close()`. Custom ua_parser parsers
+        are only available in the workers if the processes are forked.
+
+        Example:
+        >>> with ShardedVerifier(Bottica(), processes=8) as sv:
+        ...     for verdict in sv.verify(rows):
+        ...         ...
+
+        :param Bottica bottica: The Bottica instance to verify with.
+            Defaults to one with the bottica-core verifiers.
+        :param int processes: The number of worker processes. Defaults
+            to the number of CPUs.
+        :param int chunk_size: The number of rows read per chunk
+        :param int cache_size: The maximum number of verdicts cached by
+            each worker
+        :param int max_pending_chunks: The maximum number of chunks
+            being verified at once, which bounds memory use. Defaults
+            to twice the number of processes.
+        """
+        self.bottica = bottica if bottica is not None else Bottica()
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.cache_size = cache_size
+        self.max_pending_chunks = max_pending_chunks or 2 * self.processes
+
+        self._in_queues: List[multiprocessing.Queue] = []
+        self._out_queue: Optional[multiprocessing.Queue] = None
+        self._workers: List[multiprocessing.Process] = []
+
+    def __enter__(self) -> "ShardedVerifier":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _start(self) -> None:
+        if self._workers:
+            return
+
+        self._out_queue = multiprocessing.Queue()
+        for _ in range(self.processes):
+            in_queue = multiprocessing.Queue()
+            worker = multiprocessing.Process(
+                target=_worker,
+                args=(self.bottica, self.cache_size, in_queue, self._out_queue),
+                daemon=True,
+            )
+            worker.start()
+            self._in_queues.append(in_queue)
+            self._workers.append(worker)
+
+    def close(self, terminate: bool = False) -> None:
+        """
+        Stop the worker processes.
+
+        :param bool terminate: Kill the workers instead of letting them
+            finish their current tasks.
+        """
+        if not terminate:
+            for in_queue in self._in_queues:
+                in_queue.put(None)
+        for worker in self._workers:
+            if terminate:
+                worker.terminate()
+            worker.join()
+
+        self._in_queues = []
+        self._out_queue = None
+        self._workers = []
+
+    def _submit(
+        self, seq: int, chunk: List[Tuple[str, str]], pending: Dict[int, list]
+    ) -> None:
+        """Split a chunk over the shards and send it to the workers."""
+        shards: Dict[int, Tuple[List[int], List[Tuple[str, str]]]] = {}
+        for position, row in enumerate(chunk):
+            positions, rows = shards.setdefault(
+                _shard(row[0], self.processes), ([], [])
+            )
+            positions.append(position)
+            rows.append(row)
+
+        pending[seq] = [[None] * len(chunk), len(shards)]
+        for shard, (positions, rows) in shards.items():
+            self._in_queues[shard].put((seq, positions, rows))
+
+    def _receive(self, pending: Dict[int, list]) -> None:
+        """Wait for the next partial result and store it."""
+        while True:
+            try:
+                seq, positions, verdicts = self._out_queue.get(timeout=_POLL_INTERVAL)
+                break
+            except queue.Empty:
+                for worker in self._workers:
+                    if not worker.is_alive():
+                        raise RuntimeError(
+                            "Worker process {} died with exit code {}".format(
+                                worker.pid, worker.exitcode
+                            )
+                        )
+
+        if positions is None:
+            raise verdicts
+
+        results = pending[seq]
+        for position, verdict in zip(positions, verdicts):
+            results[0][position] = verdict
+        results[1] -= 1
+
+    def verify(self, rows: Iterable[Tuple[str, str]]) -> Iterator[Verdict]:
+        """
+        Verify (ip, user_agent) rows.
+
+        :param Iterable[Tuple[str, str]] rows: The rows to verify
+        :return: A verdict per row, in the same order as the rows
+        """
+        self._start()
+        rows = iter(rows)
+        pending: Dict[int, list] = {}
+        next_seq = 0
+        n_submitted = 0
+        exhausted = False
+
+        try:
+            while True:
+                while not exhausted and len(pending) < self.max_pending_chunks:
+                    chunk = list(islice(rows, self.chunk_size))
+                    if not chunk:
+                        exhausted = True
+                        break
+                    self._submit(n_submitted, chunk, pending)
+                    n_submitted += 1
+
+                if not pending:
+                    return
+
+                if pending[next_seq][1] == 0:
+                    verdicts, _ = pending.pop(next_seq)
+                    next_seq += 1
+                    yield from verdicts
+                else:
+                    self._receive(pending)
+        finally:
+            # Results still in flight would end up in the next call, so
+            # start over with fresh workers if we didn't finish
+            if pending:
+                self.close(terminate=True)
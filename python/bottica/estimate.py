@@ -0,0 +1,217 @@
+import math
+import random
+from collections import Counter, defaultdict
+from itertools import accumulate
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from bottica.bottica import Bottica
+
+
+class ShareEstimate(NamedTuple):
+    """
+    The estimated share of genuine requests for a single claimed bot.
+
+    The shares are weighted by requests, i.e. `genuine_share` estimates
+    the fraction of requests claiming to be the bot that come from an IP
+    that verifies. (`ci_low`, `ci_high`) is the confidence interval of
+    `genuine_share`. If every distinct IP was verified, the share is
+    exact and the interval collapses to it.
+
+    IPs whose verification failed with an error (e.g. a malformed IP, or
+    a DNS failure) are counted in `errors`, and left out of the shares.
+    If no IP could be verified, `genuine_share` is NaN.
+    """
+
+    botname: str
+    requests: int
+    distinct_ips: int
+    verified_ips: int
+    genuine_share: float
+    ci_low: float
+    ci_high: float
+    exact: bool
+    errors: int = 0
+
+    @property
+    def spoofed_share(self) -> float:
+        return 1 - self.genuine_share
+
+    @property
+    def spoofed_ci(self) -> Tuple[float, float]:
+        return 1 - self.ci_high, 1 - self.ci_low
+
+
+def _z_score(confidence: float) -> float:
+    """The two-sided standard normal quantile for a confidence level."""
+    target = 1 - (1 - confidence) / 2
+    low, high = 0.0, 10.0
+    for _ in range(60):
+        mid = (low + high) / 2
+        if 0.5 * (1 + math.erf(mid / math.sqrt(2))) < target:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def _wilson_interval(successes: int, n: int, z: float) -> Tuple[float, float]:
+    """The Wilson score interval for a binomial proportion."""
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z**2 / n
+    center = (p + z**2 / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def count_claims(
+    bottica: Bottica, rows: Iterable[Tuple[str, str]]
+) -> Dict[str, Counter]:
+    """
+    Count the requests per IP for every claimed bot with verifiers.
+
+    :param Bottica bottica: The Bottica instance to parse bots with
+    :param Iterable rows: (ip, user_agent) rows
+    :return: A mapping from bot name to a Counter of requests per IP
+    """
+    botnames: Dict[str, str] = {}
+    claims: Dict[str, Counter] = defaultdict(Counter)
+    for ip, user_agent in rows:
+        botname = botnames.get(user_agent)
+        if botname is None:
+            botname = botnames[user_agent] = bottica.parse_ua(user_agent)
+        if botname in bottica.verifiers:
+            claims[botname][ip] += 1
+    return dict(claims)
+
+
+def _estimate_bot(
+    bottica: Bottica,
+    botname: str,
+    ip_counts: Counter,
+    z: float,
+    precision: float,
+    max_lookups: Optional[int],
+    batch_size: int,
+    rng: random.Random,
+    executor: ThreadPoolExecutor,
+) -> ShareEstimate:
+    """Sequentially sample a single stratum until it's precise enough."""
+    ips: List[str] = list(ip_counts)
+    cum_weights = list(accumulate(ip_counts[ip] for ip in ips))
+    requests = cum_weights[-1]
+    # None for IPs whose verification failed, which aren't counted
+    verdicts: Dict[str, Optional[bool]] = {}
+    draws = successes = 0
+
+    def verify(ip: str) -> Optional[bool]:
+        try:
+            return bottica.verify_bot(ip, botname)
+        except (OSError, ValueError):
+            return None
+
+    def result(share: float, low: float, high: float, exact: bool) -> ShareEstimate:
+        errors = sum(ok is None for ok in verdicts.values())
+        return ShareEstimate(
+            botname, requests, len(ips), len(verdicts), share, low, high, exact, errors
+        )
+
+    while True:
+        if len(verdicts) == len(ips):
+            counted = sum(
+                ip_counts[ip] for ip, ok in verdicts.items() if ok is not None
+            )
+            if not counted:
+                return result(math.nan, 0.0, 1.0, False)
+            genuine = sum(ip_counts[ip] for ip, ok in verdicts.items() if ok)
+            share = genuine / counted
+            return result(share, share, share, True)
+
+        low, high = _wilson_interval(successes, draws, z)
+        out_of_budget = max_lookups is not None and len(verdicts) >= max_lookups
+        if out_of_budget or (draws and (high - low) / 2 <= precision):
+            return result(successes / draws if draws else math.nan, low, high, False)
+
+        sample = rng.choices(ips, cum_weights=cum_weights, k=batch_size)
+        new_ips = list(dict.fromkeys(ip for ip in sample if ip not in verdicts))
+        if max_lookups is not None and len(verdicts) + len(new_ips) > max_lookups:
+            # Cut the batch off at the first draw we can't afford to verify,
+            # so that the accepted draws are still an unbiased sample
+            new_ips = new_ips[: max_lookups - len(verdicts)]
+            affordable = set(verdicts).union(new_ips)
+            for i, ip in enumerate(sample):
+                if ip not in affordable:
+                    sample = sample[:i]
+                    break
+        verdicts.update(zip(new_ips, executor.map(verify, new_ips)))
+
+        # Draws of IPs that failed to verify are left out
+        outcomes = [verdicts[ip] for ip in sample if verdicts[ip] is not None]
+        draws += len(outcomes)
+        successes += sum(outcomes)
+
+
+def estimate_shares(
+    bottica: Bottica,
+    rows: Iterable[Tuple[str, str]],
+    precision: float = 0.02,
+    max_lookups: Optional[int] = None,
+    confidence: float = 0.95,
+    batch_size: int = 50,
+    max_workers: int = 16,
+    seed: Optional[int] = None,
+) -> Dict[str, ShareEstimate]:
+    """
+    Estimate the share of genuine requests per claimed bot by sampling.
+
+    Instead of verifying every distinct IP, a random sample of IPs is
+    verified for every claimed bot (stratum). IPs are drawn with
+    probability proportional to their number of requests, so the
+    fraction of genuine draws is an unbiased estimate of the share of
+    genuine requests. Draws are taken in batches until the confidence
+    interval is within `precision` of the estimate, or until
+    `max_lookups` distinct IPs of the bot have been verified. If all
+    distinct IPs end up verified, the exact share is returned.
+
+    Example:
+    >>> estimates = estimate_shares(Bottica(), rows, precision=0.01)
+    >>> estimates["Googlebot"].genuine_share
+    0.973
+
+    :param Bottica bottica: The Bottica instance to verify with
+    :param Iterable rows: (ip, user_agent) rows
+    :param float precision: The targeted half-width of the confidence
+        interval
+    :param int max_lookups: The maximum number of distinct IPs to verify
+        per bot, to bound the DNS load
+    :param float confidence: The confidence level of the intervals
+    :param int batch_size: The number of draws per sampling round. The
+        new IPs of a round are verified concurrently.
+    :param int max_workers: The maximum number of concurrent verifications
+    :param int seed: An optional seed for reproducible samples
+    :return: A mapping from bot name to its share estimate
+    """
+    if max_lookups is not None and max_lookups < 1:
+        raise ValueError("max_lookups must be at least 1")
+
+    z = _z_score(confidence)
+    rng = random.Random(seed)
+    claims = count_claims(bottica, rows)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return {
+            botname: _estimate_bot(
+                bottica,
+                botname,
+                ip_counts,
+                z,
+                precision,
+                max_lookups,
+                batch_size,
+                rng,
+                executor,
+            )
+            for botname, ip_counts in claims.items()
+        }
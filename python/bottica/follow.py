@@ -0,0 +1,298 @@
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from bottica.bottica import Bottica
+from bottica.engine import Verdict, verify_row
+
+# Apache/nginx "combined" log format: the client IP is the first field
+# and the User-Agent is the last quoted field
+_COMBINED_LOG_RE = re.compile(
+    r'^(\S+) \S+ \S+ \[[^\]]*\] "(?:[^"\\]|\\.)*" \S+ \S+ '
+    r'"(?:[^"\\]|\\.)*" "((?:[^"\\]|\\.)*)"'
+)
+
+
+def parse_combined_log(line: str) -> Optional[Tuple[str, str]]:
+    """
+    Parse the IP and User-Agent from a line in combined log format.
+
+    :param str line: A log line
+    :return: (ip, user_agent), or None if the line can't be parsed
+    """
+    match = _COMBINED_LOG_RE.match(line)
+    if match is None:
+        return None
+    return match.group(1), match.group(2)
+
+
+class _FileState:
+    """The read position in a followed file."""
+
+    def __init__(self, path: str, inode: int = None, device: int = None, offset=0):
+        self.path = path
+        self.inode = inode
+        self.device = device
+        self.offset = offset
+        self.handle: Optional[BinaryIO] = None
+
+    def to_dict(self) -> dict:
+        return {"inode": self.inode, "device": self.device, "offset": self.offset}
+
+
+class LogFollower:
+    def __init__(
+        self,
+        paths: Iterable[Union[Path, str]],
+        checkpoint_path: Union[Path, str, None] = None,
+        start_at_end: bool = False,
+        max_lines: int = 10000,
+    ):
+        """
+        Incrementally read new lines from (rotating) log files.
+
+        Every call to `read()` returns only the lines that were appended
+        since the previous call. The position in each file (its inode
+        and byte offset) can be persisted with `commit()`, so that a new
+        follower with the same `checkpoint_path` resumes exactly where
+        the previous one left off.
+
+        Log rotation is handled for both the rename and the copytruncate
+        strategies of logrotate. After a rename, the remainder of the
+        old file is read before continuing with the new file, also when
+        the rotation happened while no follower was running (as long as
+        the rotated file is still in the same directory). A truncated
+        file is read again from the start.
+
+        :param Iterable paths: The log files to follow
+        :param checkpoint_path: Optional path of a JSON file to persist
+            the read positions to
+        :param bool start_at_end: Whether files without a checkpoint are
+            read from their current end rather than from the start
+        :param int max_lines: The maximum number of lines returned per
+            file by a single `read()`
+        """
+        self.checkpoint_path = checkpoint_path
+        self.start_at_end = start_at_end
+        self.max_lines = max_lines
+
+        checkpoint = self._load_checkpoint()
+        self._files: Dict[str, _FileState] = {}
+        for path in paths:
+            path = str(path)
+            self._files[path] = _FileState(path, **checkpoint.get(path, {}))
+
+    def _load_checkpoint(self) -> Dict[str, dict]:
+        if self.checkpoint_path is None:
+            return {}
+        try:
+            with open(self.checkpoint_path) as h:
+                return json.load(h)
+        except FileNotFoundError:
+            return {}
+
+    def commit(self) -> None:
+        """
+        Persist the current read positions to the checkpoint file.
+
+        Call this once the lines returned by `read()` have been fully
+        processed. The checkpoint is replaced atomically.
+        """
+        if self.checkpoint_path is None:
+            return
+
+        checkpoint = {path: state.to_dict() for path, state in self._files.items()}
+        tmp_path = "{}.tmp".format(self.checkpoint_path)
+        with open(tmp_path, "w") as h:
+            json.dump(checkpoint, h)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def close(self) -> None:
+        """Close all open files."""
+        for state in self._files.values():
+            if state.handle is not None:
+                state.handle.close()
+                state.handle = None
+
+    def __enter__(self) -> "LogFollower":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def read(self) -> List[Tuple[str, str]]:
+        """
+        Read the complete lines appended since the last read.
+
+        A trailing line without newline is only returned once it's
+        complete.
+
+        :return: (path, line) pairs, with the newlines stripped
+        """
+        lines = []
+        for path, state in self._files.items():
+            lines.extend((path, line) for line in self._read_file(state))
+        return lines
+
+    def _open(self, state: _FileState, from_start: bool = False) -> bool:
+        """Open the file for a state, resuming from a checkpoint."""
+        try:
+            handle = open(state.path, "rb")
+        except FileNotFoundError:
+            return False
+        stat = os.fstat(handle.fileno())
+
+        if state.inode is None:
+            # Never seen before
+            state.offset = stat.st_size if self.start_at_end and not from_start else 0
+        elif (stat.st_ino, stat.st_dev) != (state.inode, state.device):
+            # Rotated while we weren't looking. Finish the old file first
+            # if we can still find it; we'll switch over on the next read.
+            rotated = self._find_rotated(state)
+            if rotated is not None:
+                handle.close()
+                state.handle = rotated
+                return True
+            state.offset = 0
+        elif stat.st_size < state.offset:
+            # Truncated while we weren't looking
+            state.offset = 0
+
+        state.handle = handle
+        state.inode, state.device = stat.st_ino, stat.st_dev
+        return True
+
+    @staticmethod
+    def _find_rotated(state: _FileState) -> Optional[BinaryIO]:
+        """Find a renamed file by inode in the directory of the original."""
+        directory, name = os.path.split(os.path.abspath(state.path))
+        for entry in os.scandir(directory):
+            if not entry.name.startswith(name) or entry.name == name:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if (stat.st_ino, stat.st_dev) == (state.inode, state.device):
+                return open(entry.path, "rb")
+        return None
+
+    def _read_lines(self, state: _FileState, max_lines: int) -> List[str]:
+        """Read complete lines from the current handle and offset."""
+        state.handle.seek(state.offset)
+        lines = []
+        while len(lines) < max_lines:
+            raw = state.handle.readline()
+            if not raw.endswith(b"\n"):
+                break
+            state.offset += len(raw)
+            lines.append(raw.rstrip(b"\r\n").decode("utf-8", errors="replace"))
+        return lines
+
+    def _read_file(self, state: _FileState) -> List[str]:
+        if state.handle is None and not self._open(state):
+            return []
+
+        lines = self._read_lines(state, self.max_lines)
+        if len(lines) == self.max_lines:
+            return lines
+
+        try:
+            stat = os.stat(state.path)
+        except FileNotFoundError:
+            # Renamed, but the new file isn't there yet
+            return lines
+
+        if (stat.st_ino, stat.st_dev) != (state.inode, state.device):
+            # Renamed: the old file might have received some last writes
+            lines.extend(self._read_lines(state, self.max_lines - len(lines)))
+            if len(lines) == self.max_lines:
+                return lines
+            state.handle.close()
+            state.handle = None
+            state.inode = state.device = None
+            if self._open(state, from_start=True):
+                lines.extend(self._read_lines(state, self.max_lines - len(lines)))
+        elif stat.st_size < state.offset:
+            # Copytruncate
+            state.offset = 0
+            lines.extend(self._read_lines(state, self.max_lines - len(lines)))
+
+        return lines
+
+
+def follow(
+    bottica: Bottica,
+    paths: Iterable[Union[Path, str]],
+    checkpoint_path: Union[Path, str, None] = None,
+    parse_line: Callable[[str], Optional[Tuple[str, str]]] = parse_combined_log,
+    interval: float = 1.0,
+    max_workers: int = 16,
+    once: bool = False,
+    **follower_kwargs
+) -> Iterator[Tuple[str, str, Optional[Verdict]]]:
+    """
+    Verify the new lines of (rotating) log files as they come in.
+
+    New lines are read in batches, and the distinct IP/User-Agent pairs
+    in each batch are verified concurrently. The read positions are
+    checkpointed after all results of a batch have been consumed, so
+    lines are processed at least once across restarts.
+
+    Example:
+    >>> for path, line, verdict in follow(Bottica(), ["access.log"], "access.ckpt"):
+    ...     if verdict is not None and verdict.verified is False:
+    ...         print("Spoofed", verdict.botname, line)
+
+    :param Bottica bottica: The Bottica instance to verify with
+    :param Iterable paths: The log files to follow
+    :param checkpoint_path: Optional path of a JSON file to persist the
+        read positions to
+    :param Callable parse_line: Parses (ip, user_agent) from a log line,
+        or returns None for lines that can't be parsed.
+    :param float interval: Seconds to wait between polls without new lines
+    :param int max_workers: The maximum number of concurrent verifications
+    :param bool once: Stop once all currently available lines are
+        processed instead of following indefinitely.
+    :param follower_kwargs: Additional arguments for `LogFollower`
+    :return: (path, line, verdict) for every new line, where the verdict
+        is None for lines that couldn't be parsed. Lines that failed to
+        verify (e.g. with a malformed IP, or a DNS failure) get a verdict
+        with `verified=None`, see `verify_row()`.
+    """
+    follower = LogFollower(paths, checkpoint_path, **follower_kwargs)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                lines = follower.read()
+                if not lines:
+                    if once:
+                        return
+                    time.sleep(interval)
+                    continue
+
+                rows = [parse_line(line) for _, line in lines]
+                distinct = list({row for row in rows if row is not None})
+                verdicts = dict(
+                    zip(
+                        distinct,
+                        executor.map(lambda row: verify_row(bottica, *row), distinct),
+                    )
+                )
+
+                for (path, line), row in zip(lines, rows):
+                    yield path, line, verdicts.get(row)
+                follower.commit()
+    finally:
+        follower.close()
@@ -0,0 +1,346 @@
+import base64
+import hashlib
+import heapq
+import math
+from ipaddress import ip_address, ip_network
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bottica.bottica import Bottica
+from bottica.cache import LRUCache
+
+
+def _hash64(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = 12, registers: Optional[bytearray] = None):
+        """
+        Approximate distinct counting in constant memory.
+
+        Uses 2**precision one-byte registers, with a relative standard
+        error of about 1.04 / sqrt(2**precision) (1.6% for the default
+        precision of 12, in 4 KiB). Sketches with the same precision can
+        be merged, e.g. across shards or days.
+
+        :param int precision: The number of index bits (4 to 18)
+        :param bytearray registers: Registers to start from
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        if registers is None:
+            registers = bytearray(2**precision)
+        self.registers = registers
+
+    def add(self, item: str) -> None:
+        h = _hash64(item)
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0**-r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small range correction: linear counting
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError("Can't merge sketches with different precisions")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "precision": self.precision,
+            "registers": base64.b64encode(bytes(self.registers)).decode(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        registers = bytearray(base64.b64decode(data["registers"]))
+        return cls(data["precision"], registers)
+
+
+class SpaceSaving:
+    def __init__(self, k: int = 100):
+        """
+        Approximate heavy hitters in constant memory.
+
+        Tracks at most `k` items. Every item with a true count above
+        N / k (where N is the total count) is guaranteed to be tracked,
+        and tracked counts overestimate the true count by at most the
+        reported error.
+
+        :param int k: The number of items to track
+        """
+        self.k = k
+        # item -> [count, error]
+        self.counters: Dict[str, List[int]] = {}
+        # A (count, item) entry per counter, ordered by count. Counts are
+        # only updated here once an entry reaches the top (counts only
+        # grow, so a stale entry can only be too low).
+        self._heap: List[Tuple[int, str]] = []
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(count, item) for item, (count, _) in self.counters.items()]
+        heapq.heapify(self._heap)
+
+    def _min_item(self) -> str:
+        """The item with the lowest count, refreshing stale entries."""
+        while True:
+            count, item = self._heap[0]
+            current = self.counters[item][0]
+            if count == current:
+                return item
+            heapq.heapreplace(self._heap, (current, item))
+
+    def _min_count(self) -> int:
+        if len(self.counters) < self.k:
+            return 0
+        return self.counters[self._min_item()][0]
+
+    def add(self, item: str, n: int = 1) -> None:
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += n
+        elif len(self.counters) < self.k:
+            self.counters[item] = [n, 0]
+            heapq.heappush(self._heap, (n, item))
+        else:
+            victim = self._min_item()
+            count, _ = self.counters.pop(victim)
+            self.counters[item] = [count + n, count]
+            heapq.heapreplace(self._heap, (count + n, item))
+
+    def merge(self, other: "SpaceSaving") -> None:
+        # An item missing from a full summary may still have occurred up
+        # to that summary's minimum count
+        own_min, other_min = self._min_count(), other._min_count()
+        merged = {}
+        for item in set(self.counters).union(other.counters):
+            own = self.counters.get(item, [own_min, own_min])
+            theirs = other.counters.get(item, [other_min, other_min])
+            merged[item] = [own[0] + theirs[0], own[1] + theirs[1]]
+
+        top = sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)
+        self.counters = dict(top[: self.k])
+        self._rebuild_heap()
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """
+        :param int n: The number of items to return, defaults to all
+        :return: (item, count, error) for the most frequent items
+        """
+        top = sorted(self.counters.items(), key=lambda kv: kv[1][0], reverse=True)
+        return [(item, count, error) for item, (count, error) in top[:n]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"k": self.k, "counters": self.counters}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SpaceSaving":
+        summary = cls(data["k"])
+        summary.counters = {item: list(c) for item, c in data["counters"].items()}
+        summary._rebuild_heap()
+        return summary
+
+
+def _subnet(ip: str) -> str:
+    """The /24 (IPv4) or /48 (IPv6) network of an IP."""
+    ipa = ip_address(ip)
+    return str(ip_network((ipa, 24 if ipa.version == 4 else 48), strict=False))
+
+
+class BotReport:
+    def __init__(self, hll_precision: int = 12, top_k: int = 100):
+        """
+        Aggregated verification results for a single claimed bot.
+
+        :param int hll_precision: The precision of the distinct IP counts
+        :param int top_k: The number of spoofing subnets to track
+        """
+        self.claimed = 0
+        self.verified = 0
+        self.errors = 0
+        self.genuine_ips = HyperLogLog(hll_precision)
+        self.spoofing_ips = HyperLogLog(hll_precision)
+        self.spoofing_subnets = SpaceSaving(top_k)
+
+    def add(self, ip: str, verified: Optional[bool]) -> None:
+        """
+        :param str ip: The IP of the request
+        :param bool verified: The verification result, or None if the
+            verification failed with an error
+        """
+        self.claimed += 1
+        if verified is None:
+            self.errors += 1
+        elif verified:
+            self.verified += 1
+            self.genuine_ips.add(ip)
+        else:
+            try:
+                subnet = _subnet(ip)
+            except ValueError:
+                # Not an IP, e.g. "-" or an X-Forwarded-For list
+                self.errors += 1
+                return
+            self.spoofing_ips.add(ip)
+            self.spoofing_subnets.add(subnet)
+
+    def merge(self, other: "BotReport") -> None:
+        self.claimed += other.claimed
+        self.verified += other.verified
+        self.errors += other.errors
+        self.genuine_ips.merge(other.genuine_ips)
+        self.spoofing_ips.merge(other.spoofing_ips)
+        self.spoofing_subnets.merge(other.spoofing_subnets)
+
+    def summary(self, top: int = 10) -> Dict[str, Any]:
+        """
+        :param int top: The number of top spoofing subnets to include
+        :return: The (estimated) aggregates as plain values
+        """
+        return {
+            "claimed": self.claimed,
+            "verified": self.verified,
+            "spoofed": self.claimed - self.verified - self.errors,
+            "errors": self.errors,
+            "error_rate": self.errors / self.claimed if self.claimed else 0.0,
+            "distinct_genuine_ips": self.genuine_ips.count(),
+            "distinct_spoofing_ips": self.spoofing_ips.count(),
+            "top_spoofing_subnets": self.spoofing_subnets.top(top),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "claimed": self.claimed,
+            "verified": self.verified,
+            "errors": self.errors,
+            "genuine_ips": self.genuine_ips.to_dict(),
+            "spoofing_ips": self.spoofing_ips.to_dict(),
+            "spoofing_subnets": self.spoofing_subnets.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BotReport":
+        report = cls()
+        report.claimed = data["claimed"]
+        report.verified = data["verified"]
+        report.errors = data["errors"]
+        report.genuine_ips = HyperLogLog.from_dict(data["genuine_ips"])
+        report.spoofing_ips = HyperLogLog.from_dict(data["spoofing_ips"])
+        report.spoofing_subnets = SpaceSaving.from_dict(data["spoofing_subnets"])
+        return report
+
+
+class Report:
+    def __init__(
+        self,
+        bottica: Optional[Bottica] = None,
+        hll_precision: int = 12,
+        top_k: int = 100,
+        cache_size: int = 2**16,
+    ):
+        """
+        Aggregate verification results per bot in a single pass.
+
+        Counts the requests claimed and verified per bot, the verification
+        errors, the distinct genuine and spoofing IPs, and the subnets
+        (/24 for IPv4, /48 for IPv6) sending the most spoofed requests.
+        Memory use is bounded regardless of the number of lines and IPs:
+        distinct counts use HyperLogLog sketches, and top subnets a
+        Space-Saving heavy hitter summary. Reports can be merged (e.g.
+        across shards or days) and serialized with `to_dict()`.
+
+        Example:
+        >>> report = Report(Bottica())
+        >>> report.update(rows)
+        >>> report.summary()["Googlebot"]["distinct_spoofing_ips"]
+        1234
+
+        :param Bottica bottica: The Bottica instance to verify with.
+            Defaults to one with the bottica-core verifiers.
+        :param int hll_precision: The precision of the distinct IP counts
+        :param int top_k: The number of spoofing subnets to track per bot
+        :param int cache_size: The maximum number of verdicts to cache
+        """
+        self.bottica = bottica if bottica is not None else Bottica()
+        self.hll_precision = hll_precision
+        self.top_k = top_k
+        self.bots: Dict[str, BotReport] = {}
+        self._cache = LRUCache(cache_size)
+
+    def _bot(self, botname: str) -> BotReport:
+        report = self.bots.get(botname)
+        if report is None:
+            report = self.bots[botname] = BotReport(self.hll_precision, self.top_k)
+        return report
+
+    def add(self, ip: str, user_agent: str) -> None:
+        """
+        Verify a request and add it to the report.
+
+        Requests from User-Agents without verifiers are ignored. Network
+        errors during verification, and malformed IPs, are counted as
+        errors instead of raised.
+
+        :param str ip: The IP (v4 or v6) of the request
+        :param str user_agent: The User-Agent of the request
+        """
+        botname = self.bottica.parse_ua(user_agent)
+        if botname not in self.bottica.verifiers:
+            return
+
+        key = (ip, botname)
+        verified = self._cache.get(key)
+        if verified is None:
+            try:
+                verified = self.bottica.verify_bot(ip, botname)
+            except (OSError, ValueError):
+                pass
+            else:
+                self._cache.put(key, verified)
+
+        self._bot(botname).add(ip, verified)
+
+    def update(self, rows: Iterable[Tuple[str, str]]) -> None:
+        """
+        Add (ip, user_agent) rows to the report.
+
+        :param Iterable rows: The rows to add
+        """
+        for ip, user_agent in rows:
+            self.add(ip, user_agent)
+
+    def merge(self, other: "Report") -> None:
+        """Merge another report (with the same settings) into this one."""
+        for botname, report in other.bots.items():
+            self._bot(botname).merge(report)
+
+    def summary(self, top: int = 10) -> Dict[str, Dict[str, Any]]:
+        """
+        :param int top: The number of top spoofing subnets per bot
+        :return: A mapping from bot name to its aggregates
+        """
+        return {botname: report.summary(top) for botname, report in self.bots.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {botname: report.to_dict() for botname, report in self.bots.items()}
+
+    @classmethod
+    def from_dict(
+        cls, data: Dict[str, Any], bottica: Optional[Bottica] = None, **kwargs
+    ) -> "Report":
+        report = cls(bottica, **kwargs)
+        report.bots = {
+            botname: BotReport.from_dict(bot) for botname, bot in data.items()
+        }
+        return report
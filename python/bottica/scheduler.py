@@ -0,0 +1,247 @@
+import functools
+import heapq
+import itertools
+import os
+import threading
+import time
+import weakref
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Set
+
+# Priority classes for DNS lookups. Lower values run first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+
+class DNSScheduler:
+    def __init__(self, max_concurrency: int = 32, max_qps: Optional[float] = None):
+        """
+        Run (blocking) DNS lookups on a shared pool of threads.
+
+        All lookups toward the resolver go through a single queue, which
+        enforces a global cap on concurrent lookups and, optionally, on
+        lookups started per second. Queued lookups are started in order
+        of priority (and in submission order within a priority), so
+        interactive lookups always go ahead of bulk work like backfills
+        or cache warming.
+
+        Example:
+        >>> scheduler = DNSScheduler(max_concurrency=16, max_qps=200)
+        >>> set_scheduler(scheduler)
+        >>> scheduler.stats()
+        {'queued': {}, 'in_flight': 0, 'completed': 0}
+
+        :param int max_concurrency: The maximum number of lookups in
+            flight at once
+        :param float max_qps: The maximum number of lookups started per
+            second, if any
+        """
+        self.max_concurrency = max_concurrency
+        self.max_qps = max_qps
+        self._init_state()
+        _schedulers.add(self)
+
+    def _init_state(self) -> None:
+        self._queue: List[tuple] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._next_slot = 0.0
+        self._shutdown = False
+
+        # Queued lookups that weren't cancelled, and their count per
+        # priority. Cancelled lookups stay in the heap until they reach
+        # the head, but aren't counted.
+        self._pending: Set[Future] = set()
+        self._queued: Counter = Counter()
+        self._in_flight = 0
+        self._completed = 0
+        self._pid = os.getpid()
+
+    def _check_fork(self) -> None:
+        # Without os.register_at_fork (Python < 3.7), detect forks here
+        if self._pid != os.getpid():
+            self._after_fork()
+
+    def submit(
+        self, fn: Callable, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs
+    ) -> Future:
+        """
+        Schedule a lookup.
+
+        :param Callable fn: The lookup function
+        :param int priority: The priority class of the lookup
+        :return: A future for the result of `fn(*args, **kwargs)`
+        """
+        self._check_fork()
+        future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Cannot schedule lookups after shutdown")
+            heapq.heappush(
+                self._queue, (priority, next(self._seq), future, fn, args, kwargs)
+            )
+            self._pending.add(future)
+            self._queued[priority] += 1
+            future.add_done_callback(functools.partial(self._on_done, priority))
+            if len(self._threads) < self.max_concurrency:
+                self._start_thread()
+            self._cond.notify()
+        return future
+
+    def _start_thread(self) -> None:
+        thread = threading.Thread(
+            target=self._run,
+            name="bottica-dns-{}".format(len(self._threads)),
+            daemon=True,
+        )
+        thread.start()
+        self._threads.append(thread)
+
+    def _after_fork(self) -> None:
+        # Only the forking thread survives in a child process: the lookup
+        # threads are gone, and the lock may be held by one of them. Start
+        # over, dropping the lookups queued by the parent.
+        self._init_state()
+
+    def _discount(self, priority: int, future: Future) -> None:
+        """Stop counting a lookup as queued, if it still is."""
+        if future in self._pending:
+            self._pending.remove(future)
+            self._queued[priority] -= 1
+            if not self._queued[priority]:
+                del self._queued[priority]
+
+    def _on_done(self, priority: int, future: Future) -> None:
+        if future.cancelled():
+            with self._cond:
+                self._discount(priority, future)
+
+    def _pop(self) -> tuple:
+        item = heapq.heappop(self._queue)
+        self._discount(item[0], item[2])
+        return item
+
+    def _next(self) -> Optional[tuple]:
+        """Wait for a rate limit slot and take the most urgent lookup."""
+        with self._cond:
+            while True:
+                # Drop cancelled lookups (e.g. the other lookups of an
+                # FCrDNS check that already matched) without spending a
+                # rate limit slot on them
+                while self._queue and self._queue[0][2].cancelled():
+                    self._pop()[2].set_running_or_notify_cancel()
+
+                if self._shutdown and not self._queue:
+                    return None
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+
+                if self.max_qps:
+                    now = time.monotonic()
+                    if self._next_slot > now:
+                        self._cond.wait(self._next_slot - now)
+                        continue
+                    self._next_slot = max(self._next_slot, now) + 1 / self.max_qps
+
+                # Pick only once we can start it, so that lookups that
+                # came in while we were waiting can still go first
+                item = self._pop()
+                self._in_flight += 1
+                return item
+
+    def _run(self) -> None:
+        while True:
+            item = self._next()
+            if item is None:
+                return
+
+            _, _, future, fn, args, kwargs = item
+            ran = future.set_running_or_notify_cancel()
+            if ran:
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+
+            with self._cond:
+                self._in_flight -= 1
+                if ran:
+                    self._completed += 1
+
+    def queue_depth(self, priority: Optional[int] = None) -> int:
+        """
+        :param int priority: Only count lookups of this priority class
+        :return: The number of lookups waiting to be started
+        """
+        with self._cond:
+            if priority is None:
+                return len(self._pending)
+            return self._queued[priority]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        :return: The queue depth per priority class, the number of
+            lookups in flight, and the number of completed lookups
+        """
+        with self._cond:
+            return {
+                "queued": dict(self._queued),
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the threads once all queued lookups have been run.
+
+        :param bool wait: Wait for the threads to finish
+        """
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+_scheduler: Optional[DNSScheduler] = None
+_scheduler_lock = threading.Lock()
+_scheduler_pid = os.getpid()
+_schedulers: "weakref.WeakSet[DNSScheduler]" = weakref.WeakSet()
+
+
+def _after_fork() -> None:
+    global _scheduler_lock, _scheduler_pid
+    _scheduler_lock = threading.Lock()
+    _scheduler_pid = os.getpid()
+    for scheduler in list(_schedulers):
+        scheduler._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def get_scheduler() -> DNSScheduler:
+    """The scheduler used for all lookups in `bottica.verification`."""
+    global _scheduler
+    if _scheduler_pid != os.getpid():
+        _after_fork()
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = DNSScheduler()
+        return _scheduler
+
+
+def set_scheduler(scheduler: DNSScheduler) -> None:
+    """
+    Replace the scheduler used for all lookups in `bottica.verification`.
+
+    :param DNSScheduler scheduler: The new scheduler
+    """
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
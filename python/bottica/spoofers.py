@@ -0,0 +1,277 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from ipaddress import collapse_addresses, ip_address, ip_network
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class _BloomFilter:
+    """A fixed-size Bloom filter over byte strings."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.n_bits = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.n_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: bytes):
+        # Kirsch-Mitzenmacher double hashing from a single digest
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.n_bits for i in range(self.n_hashes))
+
+    def add(self, key: bytes) -> None:
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(
+            self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key)
+        )
+
+
+class SpooferTracker:
+    def __init__(
+        self,
+        ttl: float = 24 * 60 * 60,
+        capacity: int = 10**6,
+        error_rate: float = 1e-4,
+        max_recent: int = 10**5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Remember IPs that failed verification, in bounded memory.
+
+        Recorded IPs are kept in two structures:
+
+        * An exact set of the `max_recent` most recently recorded IPs,
+          which is also what gets exported to firewall formats.
+        * A pair of Bloom filters that remember (many) more IPs in a
+          fixed amount of memory, at the cost of a small chance
+          (`error_rate`) of reporting an IP that was never recorded.
+
+        Entries decay: an IP is forgotten between `ttl / 2` and `ttl`
+        seconds after it was last recorded. A new Bloom filter is started
+        every `ttl / 2` seconds, replacing the oldest one, or earlier
+        once `capacity` IPs were added to the current one. This keeps
+        the error rate bounded even under millions of spoofing IPs (at
+        the cost of forgetting them sooner).
+
+        Example:
+        >>> spoofers = SpooferTracker(ttl=3600)
+        >>> btca = Bottica(spoofers=spoofers)
+        >>> btca.verify_ua("1.2.3.4", "Googlebot/2.1")
+        False
+        >>> spoofers.is_spoofer("1.2.3.4")
+        True
+
+        :param float ttl: How long (in seconds) to remember an IP
+        :param int capacity: The number of IPs per Bloom filter
+        :param float error_rate: The false positive rate of the Bloom
+            filters when at capacity
+        :param int max_recent: The maximum number of IPs in the exact set
+        :param Callable clock: Returns the current time in seconds
+        """
+        self.ttl = ttl
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_recent = max_recent
+        self.clock = clock
+
+        self._recent: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
+        # (creation time, filter) pairs, newest first
+        self._filters: List[Tuple[float, _BloomFilter]] = [
+            (clock(), self._new_filter())
+        ]
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # Locks can't be pickled (e.g. when a Bottica is sent to worker
+        # processes)
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _new_filter(self) -> _BloomFilter:
+        return _BloomFilter(self.capacity, self.error_rate)
+
+    def _maybe_rotate(self, now: float) -> None:
+        created, current = self._filters[0]
+        if now - created >= self.ttl / 2 or current.count >= self.capacity:
+            self._filters.insert(0, (now, self._new_filter()))
+
+        # Everything in a filter was added after it was created, so it
+        # has all expired once the filter is older than the ttl
+        self._filters = [
+            (created, f) for created, f in self._filters[:2] if now - created < self.ttl
+        ]
+
+    @staticmethod
+    def _key(ip: str) -> Optional[bytes]:
+        """The packed IP, or None if it's not a valid IP."""
+        try:
+            return ip_address(ip).packed
+        except ValueError:
+            return None
+
+    def record(self, ip: str, botname: Optional[str] = None) -> None:
+        """
+        Record an IP that failed verification.
+
+        Values that aren't valid IPs (e.g. "-") are ignored.
+
+        :param str ip: The IP (v4 or v6)
+        :param str botname: The bot the IP claimed to be
+        """
+        key = self._key(ip)
+        if key is None:
+            return
+        with self._lock:
+            now = self.clock()
+            self._maybe_rotate(now)
+            self._filters[0][1].add(key)
+
+            self._recent[ip] = (now + self.ttl, botname)
+            self._recent.move_to_end(ip)
+            if len(self._recent) > self.max_recent:
+                self._recent.popitem(last=False)
+
+    def is_spoofer(self, ip: str) -> bool:
+        """
+        Check whether an IP is a known spoofer.
+
+        :param str ip: The IP (v4 or v6)
+        :return: Whether the IP recently failed verification. False for
+            values that aren't valid IPs.
+        """
+        key = self._key(ip)
+        if key is None:
+            return False
+        with self._lock:
+            now = self.clock()
+            self._maybe_rotate(now)
+
+            entry = self._recent.get(ip)
+            if entry is not None:
+                if entry[0] > now:
+                    return True
+                del self._recent[ip]
+            filters = [f for _, f in self._filters]
+
+        return any(key in f for f in filters)
+
+    def recent(self) -> Dict[str, Optional[str]]:
+        """
+        The IPs in the exact set that haven't expired.
+
+        :return: A mapping from IP to the bot name it claimed to be
+        """
+        with self._lock:
+            now = self.clock()
+            while self._recent:
+                ip, (expires, _) = next(iter(self._recent.items()))
+                if expires > now:
+                    break
+                del self._recent[ip]
+            return {ip: botname for ip, (_, botname) in self._recent.items()}
+
+    def networks(self, prefixlen_v4: int = 32, prefixlen_v6: int = 128) -> List:
+        """
+        The recent spoofing IPs aggregated into as few CIDRs as possible.
+
+        :param int prefixlen_v4: Widen every IPv4 address to a network of
+            this prefix length before aggregating (e.g. 24 to block /24s)
+        :param int prefixlen_v6: Widen every IPv6 address to a network of
+            this prefix length before aggregating (e.g. 48 to block /48s)
+        :return: IPv4 networks followed by IPv6 networks
+        """
+        v4, v6 = [], []
+        for ip in self.recent():
+            ipa = ip_address(ip)
+            if ipa.version == 4:
+                v4.append(ip_network((ipa, prefixlen_v4), strict=False))
+            else:
+                v6.append(ip_network((ipa, prefixlen_v6), strict=False))
+        return list(collapse_addresses(v4)) + list(collapse_addresses(v6))
+
+    def export_ipset(self, set_name: str = "bottica-spoofers", **kwargs) -> str:
+        """
+        Export the recent spoofing networks as `ipset restore` input.
+
+        IPv4 networks go into `set_name`, IPv6 networks into
+        `{set_name}-v6`. The networks are added to temporary sets, which
+        are then swapped in, so the sets are never empty while loading
+        and networks that are no longer exported get unblocked.
+
+        :param str set_name: The name of the ipset
+        :param kwargs: Prefix lengths to aggregate to, see `networks()`
+        :return: The ipset commands
+        """
+        names = {4: set_name, 6: "{}-v6".format(set_name)}
+        families = {4: "inet", 6: "inet6"}
+        temp_names = {version: "{}-tmp".format(name) for version, name in names.items()}
+
+        lines = []
+        for version in (4, 6):
+            for name in (names[version], temp_names[version]):
+                lines.append(
+                    "create {} hash:net family {} -exist".format(
+                        name, families[version]
+                    )
+                )
+            # Left over from an interrupted restore
+            lines.append("flush {}".format(temp_names[version]))
+        lines.extend(
+            "add {} {} -exist".format(temp_names[net.version], net)
+            for net in self.networks(**kwargs)
+        )
+        for version in (4, 6):
+            lines.append("swap {} {}".format(temp_names[version], names[version]))
+            lines.append("destroy {}".format(temp_names[version]))
+        return "\n".join(lines) + "\n"
+
+    def export_nftables(
+        self, table: str = "inet filter", set_name: str = "bottica-spoofers", **kwargs
+    ) -> str:
+        """
+        Export the recent spoofing networks as an `nft -f` script.
+
+        IPv4 networks go into `{set_name}-v4`, IPv6 networks into
+        `{set_name}-v6`, both in `table` (which must already exist). The
+        sets are flushed first, so networks that are no longer exported
+        get unblocked.
+
+        :param str table: The family and name of the nftables table
+        :param str set_name: The prefix of the nftables set names
+        :param kwargs: Prefix lengths to aggregate to, see `networks()`
+        :return: The nft commands
+        """
+        networks = self.networks(**kwargs)
+        lines = []
+        for version, addr_type in ((4, "ipv4_addr"), (6, "ipv6_addr")):
+            name = "{}-v{}".format(set_name, version)
+            lines.append(
+                "add set {} {} {{ type {}; flags interval; }}".format(
+                    table, name, addr_type
+                )
+            )
+            lines.append("flush set {} {}".format(table, name))
+            elements = [str(net) for net in networks if net.version == version]
+            if elements:
+                lines.append(
+                    "add element {} {} {{ {} }}".format(
+                        table, name, ", ".join(elements)
+                    )
+                )
+        return "\n".join(lines) + "\n"
@@ -1,7 +1,10 @@
 import socket
-from typing import Iterable, Tuple, Union, List
+from concurrent.futures import as_completed
+from typing import Iterable, Tuple, Union, List, Optional
 from ipaddress import ip_address, ip_network
 
+from bottica.scheduler import PRIORITY_INTERACTIVE, get_scheduler
+
 # socket.herror error numbers
 # http://sourceware.org/git/?p=glibc.git;a=blob;f=resolv/netdb.h#l62
 _ERRNO_HOST_NOT_FOUND = 1
@@ -23,8 +26,34 @@ _GAIERROR_RETRY_ERRNOS = (
 )
 _GAIERROR_NOTFOUND_ERRNOS = (socket.EAI_NONAME,)
 
+# getaddrinfo additionally reports a host without records of the
+# requested family (e.g. no AAAA) with these, where available
+_GAIERROR_NODATA_ERRNOS = _GAIERROR_NOTFOUND_ERRNOS + tuple(
+    getattr(socket, name)
+    for name in ("EAI_NODATA", "EAI_ADDRFAMILY")
+    if hasattr(socket, name)
+)
+
 _NOT_FOUND_RESPONSE = (None, None, None)
 
+# Address families to resolve in the forward step of FCrDNS (A and AAAA)
+_FORWARD_FAMILIES = (socket.AF_INET, socket.AF_INET6)
+
+
+def _normalize_ip(ip: str) -> str:
+    """
+    Normalize the textual representation of an IP.
+
+    IPv6 addresses are compressed and lowercased, and IPv4-mapped IPv6
+    addresses (e.g. "::ffff:1.2.3.4") are converted to plain IPv4 so
+    that they compare equal to the A records of a host.
+    """
+    ipa = ip_address(ip.split("%", 1)[0])
+    mapped = getattr(ipa, "ipv4_mapped", None)
+    if mapped is not None:
+        ipa = mapped
+    return str(ipa)
+
 
 def _gethostbyaddr(
     ip: str, max_tries: int = 1
@@ -55,7 +84,39 @@ def _gethostbyaddr(
             raise
 
 
-def get_hostname_by_ip(ip: str, max_tries: int = 1) -> str:
+def _getaddrinfo(hostname: str, family: int, max_tries: int = 1) -> List[str]:
+    """
+    Resolve the addresses of a single family for a host, with automatic
+    retries on transient errors.
+
+    Returns an empty list instead of raising exceptions if the host
+    has no addresses of the requested family.
+    """
+    try:
+        infos = socket.getaddrinfo(hostname, None, family, socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        errno, message = e.args
+        if errno in _GAIERROR_NODATA_ERRNOS:
+            return []
+        elif errno in _GAIERROR_RETRY_ERRNOS and max_tries > 1:
+            return _getaddrinfo(hostname, family, max_tries - 1)
+        else:
+            raise
+    except socket.herror as e:
+        errno, message = e.args
+        if errno in _HERROR_NOTFOUND_ERRNOS:
+            return []
+        elif errno in _HERROR_RETRY_ERRNOS and max_tries > 1:
+            return _getaddrinfo(hostname, family, max_tries - 1)
+        else:
+            raise
+
+    return [_normalize_ip(sockaddr[0]) for _, _, _, _, sockaddr in infos]
+
+
+def get_hostname_by_ip(
+    ip: str, max_tries: int = 1, priority: int = PRIORITY_INTERACTIVE
+) -> str:
     """
     Perform a reverse DNS lookup for a given IP.
 
@@ -64,34 +125,77 @@ def get_hostname_by_ip(ip: str, max_tries: int = 1) -> str:
     :param str ip:
     :param int max_tries: The maximum number of tries in case of
         transient network errors.
+    :param int priority: The scheduling priority of the lookup
     :return: the hostname determined by rDNS.
     """
-    name, _, _ = _gethostbyaddr(ip, max_tries)
+    future = get_scheduler().submit(_gethostbyaddr, ip, max_tries, priority=priority)
+    name, _, _ = future.result()
     return name
 
 
-def get_ips_by_hostname(hostname: str, max_tries: int = 1) -> List[str]:
+def get_hostnames_by_ip(
+    ip: str, max_tries: int = 1, priority: int = PRIORITY_INTERACTIVE
+) -> Optional[List[str]]:
+    """
+    Perform a reverse DNS lookup for a given IP, including aliases.
+
+    Returns None if the hostname cannot be determined.
+
+    :param str ip:
+    :param int max_tries: The maximum number of tries in case of
+        transient network errors.
+    :param int priority: The scheduling priority of the lookup
+    :return: the primary hostname determined by rDNS, followed by any
+        aliases (additional PTR names) reported for the IP.
+    """
+    future = get_scheduler().submit(_gethostbyaddr, ip, max_tries, priority=priority)
+    name, aliases, _ = future.result()
+    if name is None:
+        return None
+    return [name] + [alias for alias in aliases if alias != name]
+
+
+def get_ips_by_hostname(
+    hostname: str, max_tries: int = 1, priority: int = PRIORITY_INTERACTIVE
+) -> Optional[List[str]]:
     """
-    Fetch the reported IP list for a given host.
+    Fetch the reported IP list (A and AAAA records) for a given host.
 
-    Returns None if the IPs cannot be determined.
+    The IPv4 and IPv6 lookups are performed concurrently. Returns None
+    if the IPs cannot be determined.
 
     :param str hostname:
     :param int max_tries: The maximum number of tries in case of
         transient network errors.
-    :return: the IP list reported by the host
+    :param int priority: The scheduling priority of the lookups
+    :return: the normalized IP list reported by the host
     """
-    _, _, ips = _gethostbyaddr(hostname, max_tries)
-    return ips
+    scheduler = get_scheduler()
+    futures = [
+        scheduler.submit(_getaddrinfo, hostname, family, max_tries, priority=priority)
+        for family in _FORWARD_FAMILIES
+    ]
+
+    ips = []
+    for future in futures:
+        ips.extend(ip for ip in future.result() if ip not in ips)
+
+    return ips or None
 
 
 def fcrdns_hosts(
-    ip: str, allowed_hosts: Iterable[str] = None, max_tries: int = 1
+    ip: str,
+    allowed_hosts: Iterable[str] = None,
+    max_tries: int = 1,
+    priority: int = PRIORITY_INTERACTIVE,
 ) -> bool:
     """
     Verify an IP via forward-confirmed reverse DNS (FCrDNS) query.
 
-    Optionally only allow hosts from a whitelist.
+    Optionally only allow hosts from a whitelist. All PTR names reported
+    for the IP (including aliases) are considered, and each is resolved
+    to both its IPv4 (A) and IPv6 (AAAA) addresses; the IP is verified
+    if any allowed name resolves back to it.
 
     :param str ip: An IP (v4 or v6)
     :param Iterable[str] allowed_hosts: An optional lists of allowed
@@ -101,22 +205,49 @@ def fcrdns_hosts(
     :param int max_tries: The maximum number of tries allowed to perform
         the FCrDNS check before raising the underlying error. Allowing
         retries can help against network instability.
+    :param int priority: The scheduling priority of the DNS lookups.
+        Lookups of bulk work (e.g. backfills) should use
+        `PRIORITY_BULK`, so they don't delay interactive ones.
 
     :return bool: Whether the IP is verified against the hosts
     """
-    name = get_hostname_by_ip(ip, max_tries)
-    if name is None:
+    names = get_hostnames_by_ip(ip, max_tries, priority)
+    if names is None:
         return False
 
     if allowed_hosts is not None:
-        if not any((name.endswith(h) for h in allowed_hosts)):
+        allowed_hosts = list(allowed_hosts)
+        names = [n for n in names if any((n.endswith(h) for h in allowed_hosts))]
+        if not names:
             return False
 
-    ips = get_ips_by_hostname(name, max_tries)
-    if ips is None:
-        return False
-
-    return ip in ips
+    # Forward-confirm all candidate PTR names at once and stop as soon as
+    # one of them resolves back to the IP. A failed lookup (e.g. SERVFAIL
+    # on AAAA) is only raised if no other lookup confirmed the IP.
+    # Lookups are submitted flat (name x family) so no scheduled lookup
+    # ever waits on another one.
+    ip = _normalize_ip(ip)
+    scheduler = get_scheduler()
+    futures = [
+        scheduler.submit(_getaddrinfo, name, family, max_tries, priority=priority)
+        for name in names
+        for family in _FORWARD_FAMILIES
+    ]
+    error = None
+    try:
+        for future in as_completed(futures):
+            try:
+                if ip in future.result():
+                    return True
+            except OSError as e:
+                error = e
+    finally:
+        for future in futures:
+            future.cancel()
+
+    if error is not None:
+        raise error
+    return False
 
 
 def ip_list(ip: str, allowed_ips: Iterable[str]) -> bool:
@@ -18,7 +18,7 @@ VERSION = "0.1.0"
 REQUIRED = ["pyyaml", "ua-parser"]
 
 # What packages are optional?
-EXTRAS = {}
+EXTRAS = {"arrow": ["pyarrow>=3.0"]}
 
 # Extra non-python content to be included
 PACKAGE_DATA = ["*.yaml"]
@@ -4,7 +4,7 @@ import pytest
 import yaml
 
 
-from bottica.bottica import _bottica_yaml_path, _uap_extras_yaml_path
+from bottica.bottica import Bottica, _bottica_yaml_path, _uap_extras_yaml_path
 
 
 @pytest.fixture(scope="session")
@@ -19,3 +19,39 @@ def uap_extras_yaml():
     """The parsed UAP extras"""
     with open(_uap_extras_yaml_path, "r") as h:
         return yaml.load(h, Loader=yaml.SafeLoader)
+
+
+@pytest.fixture(scope="session")
+def googlebot_ua():
+    """A Googlebot User-Agent"""
+    return "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)"
+
+
+@pytest.fixture(scope="session")
+def browser_ua():
+    """A browser (Firefox) User-Agent"""
+    return "Mozilla/5.0 (X11; Linux x86_64; rv:80.0) Gecko/20100101 Firefox/80.0"
+
+
+@pytest.fixture
+def btca():
+    """A Bottica that only knows Googlebot, verified without DNS"""
+    b = Bottica(yaml_path=None)
+    b.verifiers["Googlebot"] = {
+        "cidr_list": ["1.2.3.4/32", "2001:db8::1/128", "10.0.0.0/16"]
+    }
+    return b
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """A clock that only moves when its `now` is set"""
+    return FakeClock()
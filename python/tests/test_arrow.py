@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from bottica import arrow  # noqa: E402
+
+
+@pytest.fixture
+def table(googlebot_ua, browser_ua):
+    return pa.table(
+        {
+            "ip": ["1.2.3.4", "2.3.4.5", "1.2.3.4", "1.2.3.4", None],
+            "user_agent": [googlebot_ua, googlebot_ua, browser_ua, None, googlebot_ua],
+        }
+    )
+
+
+def test_verify_table(btca, table):
+    result = arrow.verify_table(btca, table)
+
+    assert result.column_names == ["ip", "user_agent", "bot", "verified"]
+    assert result.column("bot").to_pylist() == [
+        "Googlebot",
+        "Googlebot",
+        "Firefox",
+        None,
+        "Googlebot",
+    ]
+    assert result.column("verified").to_pylist() == [True, False, None, None, None]
+
+
+def test_parses_each_ua_once_and_caches_verdicts(btca, table, mocker):
+    parse = mocker.spy(btca, "parse_ua")
+    verify = mocker.spy(btca, "verify_bot")
+
+    arrow.verify_table(btca, pa.concat_tables([table, table]), batch_size=5)
+
+    assert parse.call_count == 4  # 2 distinct UAs x 2 batches
+    assert verify.call_count == 2  # cached across batches
+
+
+def test_verification_errors_are_null(btca, googlebot_ua):
+    table = pa.table(
+        {"ip": ["-", "1.2.3.4, 5.6.7.8", "1.2.3.4"], "user_agent": [googlebot_ua] * 3}
+    )
+    result = arrow.verify_table(btca, table)
+    assert result.column("verified").to_pylist() == [None, None, True]
+
+
+def test_custom_columns(btca, googlebot_ua):
+    table = pa.table({"client": ["1.2.3.4"], "ua": [googlebot_ua]})
+    result = arrow.verify_table(
+        btca, table, ip_column="client", ua_column="ua", verified_column="ok"
+    )
+    assert result.column("ok").to_pylist() == [True]
+
+
+def test_verify_empty_table(btca, table):
+    result = arrow.verify_table(btca, table.slice(0, 0))
+    assert result.num_rows == 0
+    assert result.column_names == ["ip", "user_agent", "bot", "verified"]
+
+
+def test_verify_parquet(btca, table, tmpdir):
+    source, destination = f"{tmpdir}/logs.parquet", f"{tmpdir}/verified.parquet"
+    pq.write_table(table, source)
+
+    arrow.verify_parquet(btca, source, destination, batch_size=2)
+
+    result = pq.read_table(destination)
+    assert result.column("verified").to_pylist() == [True, False, None, None, None]
+
+
+def test_verify_parquet_failure_keeps_destination(btca, table, tmpdir, mocker):
+    source, destination = f"{tmpdir}/logs.parquet", f"{tmpdir}/verified.parquet"
+    pq.write_table(table, source)
+    pq.write_table(table.slice(0, 1), destination)
+    mocker.patch.object(
+        btca, "verify_bot", side_effect=[True, RuntimeError("verifier broke")]
+    )
+
+    with pytest.raises(RuntimeError):
+        arrow.verify_parquet(btca, source, destination, batch_size=1)
+
+    assert pq.read_table(destination).equals(table.slice(0, 1))
+    assert sorted(os.listdir(tmpdir)) == ["logs.parquet", "verified.parquet"]
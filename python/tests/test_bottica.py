@@ -2,7 +2,7 @@ import yaml
 import pytest
 from ua_parser import user_agent_parser
 
-from bottica import bottica
+from bottica import bottica, scheduler
 
 
 def test_load_uap_extras(uap_extras_yaml, tmpdir, mocker):
@@ -55,6 +55,14 @@ class TestBottica:
 
         assert mock.called_once()
 
+    def test_verify_passes_priority(self, mocker):
+        b = bottica.Bottica(priority=scheduler.PRIORITY_BULK)
+        mock = mocker.patch("bottica.bottica.fcrdns_hosts")
+
+        b.verify("1.2.3.4", "fcrdns_hosts", [])
+
+        assert mock.call_args[1]["priority"] == scheduler.PRIORITY_BULK
+
     def test_unknown_verifier_raises(self):
         b = bottica.Bottica()
         with pytest.raises(ValueError):
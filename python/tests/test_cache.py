@@ -0,0 +1,222 @@
+import os
+import pickle
+import threading
+import time
+
+import pytest
+
+from bottica import bottica, cache, spoofers
+
+
+class Verifier:
+    """Counts verifications, optionally blocking them until released"""
+
+    def __init__(self, verdict=True, block=False):
+        self.verdict = verdict
+        self.calls = 0
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.release.wait()
+        return self.verdict
+
+
+def drain(c):
+    """Wait for all background refreshes to finish"""
+    if c._executor is not None:
+        c._executor.shutdown(wait=True)
+        c._executor = None
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def test_lru_cache_evicts_oldest():
+    lru = cache.LRUCache(2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    lru.get("a")
+    lru.put("c", 3)
+
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert len(lru) == 2
+
+
+def test_caches_verdicts(clock):
+    c = cache.VerdictCache(ttl=100, clock=clock)
+    verify = Verifier()
+
+    assert c.get_or_verify("key", verify)
+    assert c.get_or_verify("key", verify)
+    assert verify.calls == 1
+
+
+def test_executor_started_lazily(clock):
+    c = cache.VerdictCache(ttl=100, min_hits=1, clock=clock)
+    c.get_or_verify("key", Verifier())
+    c.get_or_verify("key", Verifier())
+    assert c._executor is None
+
+    clock.now = 90
+    c.get_or_verify("key", Verifier())
+    assert c._executor is not None
+    drain(c)
+
+
+def test_cold_expired_verifies_synchronously(clock):
+    c = cache.VerdictCache(ttl=100, clock=clock)
+    verify = Verifier()
+    c.get_or_verify("key", verify)
+
+    clock.now = 101
+    c.get_or_verify("key", verify)
+
+    assert verify.calls == 2
+
+
+def test_hot_refreshed_ahead(clock):
+    c = cache.VerdictCache(ttl=100, refresh_ahead=0.8, min_hits=2, clock=clock)
+    c.get_or_verify("key", Verifier(True))
+    c.get_or_verify("key", Verifier(True))
+
+    clock.now = 90
+    refresh = Verifier(False, block=True)
+    assert c.get_or_verify("key", refresh)  # stale verdict while refreshing
+    assert c.get_or_verify("key", refresh)
+    refresh.release.set()
+    drain(c)
+
+    assert refresh.calls == 1
+    assert not c.get_or_verify("key", refresh)
+    assert c._data["key"].fetched_at == 90
+
+
+def test_hot_expired_served_stale(clock):
+    c = cache.VerdictCache(ttl=100, min_hits=1, clock=clock)
+    c.get_or_verify("key", Verifier(True))
+    c.get_or_verify("key", Verifier(True))
+
+    clock.now = 150
+    refresh = Verifier(False, block=True)
+    assert c.get_or_verify("key", refresh)
+    refresh.release.set()
+    drain(c)
+
+    assert not c.get_or_verify("key", refresh)
+
+
+def test_max_refreshes(clock):
+    c = cache.VerdictCache(ttl=100, min_hits=1, max_refreshes=1, clock=clock)
+    for key in ["a", "b"]:
+        c.get_or_verify(key, Verifier())
+        c.get_or_verify(key, Verifier())
+
+    clock.now = 90
+    refresh = Verifier(block=True)
+    c.get_or_verify("a", refresh)
+    c.get_or_verify("b", refresh)
+    refresh.release.set()
+    drain(c)
+
+    assert refresh.calls == 1
+
+
+def test_failed_refresh_keeps_verdict(clock):
+    c = cache.VerdictCache(ttl=100, min_hits=1, clock=clock)
+    c.get_or_verify("key", Verifier(True))
+
+    def fail():
+        raise OSError("DNS is down")
+
+    clock.now = 90
+    assert c.get_or_verify("key", fail)
+    drain(c)
+    assert c._data["key"].verdict
+    assert c._data["key"].fetched_at == 0
+
+
+def test_max_size(clock):
+    c = cache.VerdictCache(max_size=2, clock=clock)
+    for key in ["a", "b", "c"]:
+        c.get_or_verify(key, Verifier())
+    assert len(c) == 2
+    assert "a" not in c._data
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+def test_refresh_after_fork(clock):
+    c = cache.VerdictCache(ttl=100, min_hits=1, max_refreshes=1, clock=clock)
+    verify = Verifier()
+    c.get_or_verify("key", verify)
+    clock.now = 90
+    c.get_or_verify("key", verify)
+    assert wait_for(lambda: verify.calls == 2 and not c._refreshing)
+
+    pid = os.fork()
+    if pid == 0:
+        ok = False
+        try:
+            clock.now = 180
+            assert c.get_or_verify("key", verify)
+            ok = wait_for(lambda: verify.calls == 3)
+        finally:
+            os._exit(0 if ok else 1)
+
+    _, status = os.waitpid(pid, 0)
+    drain(c)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+
+
+def test_fork_detected_without_hook(clock):
+    c = cache.VerdictCache(ttl=100, min_hits=1, max_refreshes=1, clock=clock)
+    verify = Verifier()
+    c.get_or_verify("key", verify)
+    # Emulate a child process on Python < 3.7, forked during a refresh
+    c._lock.acquire()
+    c._refreshing = 1
+    c._pid = -1
+
+    clock.now = 90
+    assert c.get_or_verify("key", verify)
+    assert wait_for(lambda: verify.calls == 2)
+    drain(c)
+
+
+def test_pickle_starts_empty():
+    c = cache.VerdictCache(ttl=123)
+    c.get_or_verify("key", Verifier())
+    c2 = pickle.loads(pickle.dumps(c))
+    assert c2.ttl == 123
+    assert len(c2) == 0
+
+
+def test_bottica_uses_cache(mocker):
+    b = bottica.Bottica(yaml_path=None, cache=cache.VerdictCache())
+    b.verifiers["Googlebot"] = {"ip_list": ["1.2.3.4"]}
+    spy = mocker.spy(b, "verify")
+
+    assert b.verify_bot("1.2.3.4", "Googlebot")
+    assert b.verify_bot("1.2.3.4", "Googlebot")
+    assert spy.call_count == 1
+
+
+def test_bottica_with_cache_and_spoofers_pickles():
+    b = bottica.Bottica(
+        yaml_path=None, cache=cache.VerdictCache(), spoofers=spoofers.SpooferTracker()
+    )
+    b.verifiers["Googlebot"] = {"ip_list": ["1.2.3.4"]}
+    b.verify_bot("2.3.4.5", "Googlebot")
+
+    b2 = pickle.loads(pickle.dumps(b))
+    assert b2.verify_bot("1.2.3.4", "Googlebot")
+    assert b2.spoofers.is_spoofer("2.3.4.5")
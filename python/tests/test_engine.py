@@ -0,0 +1,100 @@
+import os
+import socket
+import threading
+
+import pytest
+
+from bottica import bottica, engine
+from bottica.cache import LRUCache
+
+
+class DyingBottica(bottica.Bottica):
+    def verify_bot(self, ip, botname):
+        os._exit(3)
+
+
+class UnpicklableBottica(bottica.Bottica):
+    def verify_bot(self, ip, botname):
+        raise TypeError(threading.Lock())
+
+
+def test_verify_row_unknown_bot(btca, browser_ua):
+    verdict = engine.verify_row(btca, "1.2.3.4", browser_ua)
+    assert verdict == engine.Verdict("Firefox", None)
+
+
+def test_verify_row_uses_cache(btca, googlebot_ua, mocker):
+    cache = LRUCache(10)
+    mock = mocker.patch.object(btca, "verify_bot", return_value=True)
+
+    engine.verify_row(btca, "1.2.3.4", googlebot_ua, cache)
+    verdict = engine.verify_row(btca, "1.2.3.4", googlebot_ua, cache)
+
+    assert verdict == engine.Verdict("Googlebot", True)
+    assert mock.call_count == 1
+
+
+def test_verify_row_errors(btca, googlebot_ua, mocker):
+    assert engine.verify_row(btca, "-", googlebot_ua) == engine.Verdict(
+        "Googlebot", None
+    )
+
+    cache = LRUCache(10)
+    mocker.patch.object(btca, "verify_bot", side_effect=socket.gaierror(-2, ""))
+    verdict = engine.verify_row(btca, "1.2.3.4", googlebot_ua, cache)
+    assert verdict == engine.Verdict("Googlebot", None)
+    assert len(cache) == 0
+
+
+def test_shard_is_stable():
+    assert engine._shard("1.2.3.4", 8) == engine._shard("1.2.3.4", 8)
+    assert 0 <= engine._shard("2001:db8::1", 8) < 8
+
+
+class TestShardedVerifier:
+    def test_verify_matches_serial(self, btca, googlebot_ua, browser_ua):
+        ips = ["1.2.3.4", "2.3.4.5", "2001:db8::1", "2001:db8::2"]
+        uas = [googlebot_ua, browser_ua]
+        rows = [(ips[i % 4], uas[i % 3 % 2]) for i in range(50)]
+
+        with engine.ShardedVerifier(btca, processes=2, chunk_size=7) as sv:
+            verdicts = list(sv.verify(rows))
+
+        assert verdicts == [engine.verify_row(btca, ip, ua) for ip, ua in rows]
+
+    def test_row_errors_dont_fail_chunk(self, btca, googlebot_ua):
+        rows = [("-", googlebot_ua), ("1.2.3.4", googlebot_ua)]
+
+        with engine.ShardedVerifier(btca, processes=2) as sv:
+            verdicts = list(sv.verify(rows))
+
+        assert verdicts == [
+            engine.Verdict("Googlebot", None),
+            engine.Verdict("Googlebot", True),
+        ]
+
+    def test_worker_errors_raised(self, btca, googlebot_ua):
+        btca.verifiers["Googlebot"] = None  # a broken config
+        rows = [("1.2.3.4", googlebot_ua)]
+
+        with engine.ShardedVerifier(btca, processes=2) as sv:
+            with pytest.raises(AttributeError):
+                list(sv.verify(rows))
+
+    def test_worker_death_raised(self, btca, googlebot_ua):
+        dying = DyingBottica(yaml_path=None)
+        dying.verifiers = btca.verifiers
+        rows = [("1.2.3.4", googlebot_ua)]
+
+        with engine.ShardedVerifier(dying, processes=2) as sv:
+            with pytest.raises(RuntimeError, match="exit code 3"):
+                list(sv.verify(rows))
+
+    def test_unpicklable_worker_errors_raised(self, btca, googlebot_ua):
+        unpicklable = UnpicklableBottica(yaml_path=None)
+        unpicklable.verifiers = btca.verifiers
+        rows = [("1.2.3.4", googlebot_ua)]
+
+        with engine.ShardedVerifier(unpicklable, processes=2) as sv:
+            with pytest.raises(RuntimeError, match="TypeError"):
+                list(sv.verify(rows))
@@ -0,0 +1,89 @@
+import math
+import socket
+
+import pytest
+
+from bottica import estimate
+
+
+@pytest.fixture
+def rows(googlebot_ua, browser_ua):
+    """75% of Googlebot requests from genuine IPs, over 2000 distinct IPs"""
+    genuine = [(f"10.0.{i % 4}.{i % 250}", googlebot_ua) for i in range(6000)]
+    spoofed = [(f"20.0.{i // 250}.{i % 250}", googlebot_ua) for i in range(2000)]
+    browsers = [("30.0.0.1", browser_ua)] * 100
+    return genuine + spoofed + browsers
+
+
+def test_z_score():
+    assert estimate._z_score(0.95) == pytest.approx(1.96, abs=1e-3)
+
+
+def test_wilson_interval_contains_estimate():
+    low, high = estimate._wilson_interval(30, 100, 1.96)
+    assert low < 0.3 < high
+
+
+def test_count_claims_ignores_unknown_bots(btca, rows):
+    claims = estimate.count_claims(btca, rows)
+    assert list(claims) == ["Googlebot"]
+    assert sum(claims["Googlebot"].values()) == 8000
+
+
+def test_estimate_exact_for_few_ips(btca, googlebot_ua):
+    rows = [("10.0.0.1", googlebot_ua)] * 3 + [("20.0.0.1", googlebot_ua)]
+    share = estimate.estimate_shares(btca, rows, precision=0.0, seed=1)["Googlebot"]
+
+    assert share.exact
+    assert share.genuine_share == 0.75
+    assert share.spoofed_share == 0.25
+
+
+def test_estimate_excludes_errors(btca, googlebot_ua):
+    rows = (
+        [("10.0.0.1", googlebot_ua)] * 3
+        + [("20.0.0.1", googlebot_ua)]
+        + [("-", googlebot_ua)] * 4
+    )
+    share = estimate.estimate_shares(btca, rows, precision=0.0, seed=1)["Googlebot"]
+
+    assert share.exact
+    assert share.errors == 1
+    assert share.genuine_share == 0.75
+
+
+@pytest.mark.parametrize("max_lookups", [None, 5])
+def test_estimate_all_errors(btca, rows, mocker, max_lookups):
+    mocker.patch.object(btca, "verify_bot", side_effect=socket.gaierror(-3, ""))
+    share = estimate.estimate_shares(
+        btca, rows[:20], precision=0.01, max_lookups=max_lookups, seed=1
+    )["Googlebot"]
+
+    assert share.errors == share.verified_ips == (max_lookups or 20)
+    assert math.isnan(share.genuine_share)
+    assert not share.exact
+
+
+def test_estimate_within_precision(btca, rows, mocker):
+    spy = mocker.spy(btca, "verify_bot")
+    share = estimate.estimate_shares(btca, rows, precision=0.05, seed=1)["Googlebot"]
+
+    assert not share.exact
+    assert share.ci_high - share.ci_low <= 0.1
+    assert share.ci_low <= 0.75 <= share.ci_high
+    assert spy.call_count == share.verified_ips < share.distinct_ips
+
+
+def test_estimate_respects_max_lookups(btca, rows, mocker):
+    spy = mocker.spy(btca, "verify_bot")
+    share = estimate.estimate_shares(btca, rows, precision=0.0, max_lookups=20, seed=1)[
+        "Googlebot"
+    ]
+
+    assert spy.call_count == share.verified_ips == 20
+    assert share.ci_low <= share.genuine_share <= share.ci_high
+
+
+def test_invalid_max_lookups(btca, rows):
+    with pytest.raises(ValueError):
+        estimate.estimate_shares(btca, rows, max_lookups=0)
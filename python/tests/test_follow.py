@@ -0,0 +1,154 @@
+import os
+
+import pytest
+
+from bottica import follow
+
+
+def log_line(ip, ua="-"):
+    return (
+        f'{ip} - - [10/Oct/2020:13:55:36 +0000] "GET / HTTP/1.1" 200 2326 '
+        f'"-" "{ua}"\n'
+    )
+
+
+def append(path, *lines):
+    with open(path, "a") as h:
+        h.writelines(lines)
+
+
+def read_lines(follower):
+    return [line for _, line in follower.read()]
+
+
+def test_parse_combined_log(googlebot_ua):
+    assert follow.parse_combined_log(log_line("2001:db8::1", googlebot_ua)) == (
+        "2001:db8::1",
+        googlebot_ua,
+    )
+
+
+def test_parse_combined_log_invalid():
+    assert follow.parse_combined_log("not a log line") is None
+
+
+class TestLogFollower:
+    def test_reads_only_new_lines(self, tmpdir):
+        path = f"{tmpdir}/access.log"
+        append(path, "a\n", "b\n")
+        follower = follow.LogFollower([path])
+
+        assert read_lines(follower) == ["a", "b"]
+        assert read_lines(follower) == []
+        append(path, "c\n")
+        assert read_lines(follower) == ["c"]
+
+    def test_partial_line_waits(self, tmpdir):
+        path = f"{tmpdir}/access.log"
+        append(path, "a\n", "b")
+        follower = follow.LogFollower([path])
+
+        assert read_lines(follower) == ["a"]
+        append(path, "c\n")
+        assert read_lines(follower) == ["bc"]
+
+    def test_start_at_end(self, tmpdir):
+        path = f"{tmpdir}/access.log"
+        append(path, "a\n")
+        follower = follow.LogFollower([path], start_at_end=True)
+
+        assert read_lines(follower) == []
+        append(path, "b\n")
+        assert read_lines(follower) == ["b"]
+
+    def test_checkpoint_resumes(self, tmpdir):
+        path = f"{tmpdir}/access.log"
+        checkpoint = f"{tmpdir}/checkpoint.json"
+        append(path, "a\n")
+        with follow.LogFollower([path], checkpoint) as follower:
+            read_lines(follower)
+            follower.commit()
+
+        append(path, "b\n")
+        with follow.LogFollower([path], checkpoint) as follower:
+            assert read_lines(follower) == ["b"]
+
+    def test_rename_rotation(self, tmpdir):
+        path = f"{tmpdir}/access.log"
+        append(path, "a\n")
+        follower = follow.LogFollower([path])
+        read_lines(follower)
+
+        append(path, "b\n")
+        os.rename(path, f"{path}.1")
+        append(path, "c\n")
+
+        assert read_lines(follower) == ["b", "c"]
+
+    def test_rename_rotation_while_stopped(self, tmpdir):
+        path = f"{tmpdir}/access.log"
+        checkpoint = f"{tmpdir}/checkpoint.json"
+        append(path, "a\n")
+        with follow.LogFollower([path], checkpoint) as follower:
+            read_lines(follower)
+            follower.commit()
+
+        append(path, "b\n")
+        os.rename(path, f"{path}.1")
+        append(path, "c\n")
+
+        with follow.LogFollower([path], checkpoint) as follower:
+            assert read_lines(follower) == ["b", "c"]
+
+    def test_copytruncate_rotation(self, tmpdir):
+        path = f"{tmpdir}/access.log"
+        append(path, "aaa\n", "bbb\n")
+        follower = follow.LogFollower([path])
+        read_lines(follower)
+
+        open(path, "w").close()
+        append(path, "c\n")
+
+        assert read_lines(follower) == ["c"]
+
+    def test_max_lines(self, tmpdir):
+        path = f"{tmpdir}/access.log"
+        append(path, "a\n", "b\n", "c\n")
+        follower = follow.LogFollower([path], max_lines=2)
+
+        assert read_lines(follower) == ["a", "b"]
+        assert read_lines(follower) == ["c"]
+
+
+def test_follow_once(tmpdir, btca, googlebot_ua):
+    path = f"{tmpdir}/access.log"
+    checkpoint = f"{tmpdir}/checkpoint.json"
+    append(
+        path,
+        log_line("1.2.3.4", googlebot_ua),
+        log_line("2.3.4.5", googlebot_ua),
+        "garbage\n",
+    )
+
+    results = list(follow.follow(btca, [path], checkpoint, once=True))
+
+    assert [verdict for _, _, verdict in results] == [
+        ("Googlebot", True),
+        ("Googlebot", False),
+        None,
+    ]
+    assert list(follow.follow(btca, [path], checkpoint, once=True)) == []
+
+
+def test_follow_once_verification_errors(tmpdir, btca, googlebot_ua):
+    path = f"{tmpdir}/access.log"
+    checkpoint = f"{tmpdir}/checkpoint.json"
+    append(path, log_line("-", googlebot_ua), log_line("1.2.3.4", googlebot_ua))
+
+    results = list(follow.follow(btca, [path], checkpoint, once=True))
+
+    assert [verdict for _, _, verdict in results] == [
+        ("Googlebot", None),
+        ("Googlebot", True),
+    ]
+    assert list(follow.follow(btca, [path], checkpoint, once=True)) == []
@@ -0,0 +1,145 @@
+import json
+import socket
+
+import pytest
+
+from bottica import report
+
+
+@pytest.mark.parametrize("n", [10, 1000, 20000])
+def test_hyperloglog_count(n):
+    hll = report.HyperLogLog()
+    for i in range(n):
+        hll.add(str(i))
+        hll.add(str(i))
+    assert hll.count() == pytest.approx(n, rel=0.05)
+
+
+def test_hyperloglog_merge():
+    a, b = report.HyperLogLog(), report.HyperLogLog()
+    for i in range(3000):
+        a.add(str(i))
+        b.add(str(i + 2000))
+    a.merge(b)
+    assert a.count() == pytest.approx(5000, rel=0.05)
+
+
+def test_hyperloglog_invalid_precision():
+    with pytest.raises(ValueError):
+        report.HyperLogLog(precision=20)
+
+
+def test_space_saving_finds_heavy_hitters():
+    summary = report.SpaceSaving(k=5)
+    for i in range(1000):
+        summary.add("heavy")
+        summary.add(f"light{i}")
+
+    item, count, error = summary.top(1)[0]
+    assert item == "heavy"
+    assert count - error <= 1000 <= count
+
+
+def test_space_saving_merge():
+    a, b = report.SpaceSaving(k=3), report.SpaceSaving(k=3)
+    a.add("x", 5)
+    a.add("y", 1)
+    b.add("x", 2)
+    b.add("z", 4)
+    a.merge(b)
+    assert [item for item, _, _ in a.top()] == ["x", "z", "y"]
+    assert a.top(1)[0][1] == 7
+
+
+def test_space_saving_evicts_minimum():
+    summary = report.SpaceSaving(k=3)
+    summary.add("a", 3)
+    summary.add("b", 1)
+    summary.add("c", 2)
+    summary.add("b", 5)  # "b" is no longer the minimum
+    summary.add("d")
+
+    assert summary.top() == [("b", 6, 0), ("a", 3, 0), ("d", 3, 2)]
+    summary.add("d", 2)
+    summary.add("e")
+    assert summary.top() == [("b", 6, 0), ("d", 5, 2), ("e", 4, 3)]
+
+
+def test_subnet():
+    assert report._subnet("1.2.3.4") == "1.2.3.0/24"
+    assert report._subnet("2001:db8:1:2::1") == "2001:db8:1::/48"
+
+
+class TestReport:
+    def test_aggregates(self, btca, googlebot_ua, browser_ua):
+        rows = (
+            [(f"10.0.0.{i}", googlebot_ua) for i in range(10)]
+            + [(f"20.0.0.{i % 5}", googlebot_ua) for i in range(20)]
+            + [("2001:db8::2", googlebot_ua)]
+            + [("30.0.0.1", browser_ua)]
+        )
+        r = report.Report(btca)
+        r.update(rows)
+
+        summary = r.summary()
+        assert list(summary) == ["Googlebot"]
+        googlebot = summary["Googlebot"]
+        assert googlebot["claimed"] == 31
+        assert googlebot["verified"] == 10
+        assert googlebot["spoofed"] == 21
+        assert googlebot["distinct_genuine_ips"] == 10
+        assert googlebot["distinct_spoofing_ips"] == 6
+        assert googlebot["top_spoofing_subnets"][0] == ("20.0.0.0/24", 20, 0)
+
+    def test_errors_counted(self, btca, googlebot_ua, mocker):
+        mocker.patch.object(btca, "verify_bot", side_effect=socket.gaierror(-2, ""))
+        r = report.Report(btca)
+        r.add("10.0.0.1", googlebot_ua)
+
+        summary = r.summary()["Googlebot"]
+        assert summary["errors"] == 1
+        assert summary["error_rate"] == 1.0
+
+    def test_invalid_ips_counted(self, btca, googlebot_ua):
+        r = report.Report(btca)
+        r.update(
+            [
+                ("-", googlebot_ua),
+                ("unknown", googlebot_ua),
+                ("1.2.3.4, 5.6.7.8", googlebot_ua),
+                ("10.0.0.1", googlebot_ua),
+            ]
+        )
+
+        summary = r.summary()["Googlebot"]
+        assert summary["errors"] == 3
+        assert summary["verified"] == 1
+
+    def test_spoofed_invalid_ip_counted(self, btca, googlebot_ua, mocker):
+        mocker.patch.object(btca, "verify_bot", return_value=False)
+        r = report.Report(btca)
+        r.add("-", googlebot_ua)
+
+        summary = r.summary()["Googlebot"]
+        assert summary["errors"] == 1
+        assert summary["spoofed"] == 0
+
+    def test_caches_verdicts(self, btca, googlebot_ua, mocker):
+        spy = mocker.spy(btca, "verify_bot")
+        r = report.Report(btca)
+        r.update([("10.0.0.1", googlebot_ua)] * 3)
+        assert spy.call_count == 1
+
+    def test_merge_and_serialize(self, btca, googlebot_ua):
+        a, b = report.Report(btca), report.Report(btca)
+        a.add("10.0.0.1", googlebot_ua)
+        b.add("10.0.0.1", googlebot_ua)
+        b.add("20.0.0.1", googlebot_ua)
+
+        a.merge(b)
+        restored = report.Report.from_dict(json.loads(json.dumps(a.to_dict())), btca)
+
+        summary = restored.summary()["Googlebot"]
+        assert summary["claimed"] == 3
+        assert summary["distinct_genuine_ips"] == 1
+        assert summary["distinct_spoofing_ips"] == 1
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+
+import pytest
+
+from bottica import scheduler
+
+
+@pytest.fixture
+def blocked():
+    """A single-threaded scheduler with its thread blocked until set()"""
+    s = scheduler.DNSScheduler(max_concurrency=1)
+    release = threading.Event()
+    s.submit(release.wait)
+    while s.stats()["in_flight"] == 0:
+        time.sleep(0.001)
+    yield s, release
+    release.set()
+    s.shutdown()
+
+
+def test_interactive_before_bulk(blocked):
+    s, release = blocked
+    order = []
+    futures = [
+        s.submit(order.append, "bulk", priority=scheduler.PRIORITY_BULK),
+        s.submit(order.append, "interactive 1"),
+        s.submit(order.append, "interactive 2"),
+    ]
+    release.set()
+    for future in futures:
+        future.result()
+
+    assert order == ["interactive 1", "interactive 2", "bulk"]
+
+
+def test_queue_depth(blocked):
+    s, release = blocked
+    s.submit(int, priority=scheduler.PRIORITY_BULK)
+    s.submit(int, priority=scheduler.PRIORITY_BULK)
+    s.submit(int)
+
+    assert s.queue_depth() == 3
+    assert s.queue_depth(scheduler.PRIORITY_BULK) == 2
+    assert s.stats() == {
+        "queued": {scheduler.PRIORITY_INTERACTIVE: 1, scheduler.PRIORITY_BULK: 2},
+        "in_flight": 1,
+        "completed": 0,
+    }
+
+
+def test_max_concurrency():
+    s = scheduler.DNSScheduler(max_concurrency=2)
+    lock = threading.Lock()
+    running, max_running = [0], [0]
+
+    def lookup():
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    for future in [s.submit(lookup) for _ in range(10)]:
+        future.result()
+    s.shutdown()
+
+    assert max_running[0] == 2
+
+
+def test_max_qps():
+    s = scheduler.DNSScheduler(max_qps=100)
+    start = time.monotonic()
+    for future in [s.submit(int) for _ in range(6)]:
+        future.result()
+    s.shutdown()
+
+    assert time.monotonic() - start >= 0.05
+
+
+def test_exceptions_propagated():
+    s = scheduler.DNSScheduler()
+    future = s.submit(int, "not a number")
+    with pytest.raises(ValueError):
+        future.result()
+    s.shutdown()
+
+
+def test_submit_after_shutdown():
+    s = scheduler.DNSScheduler()
+    s.shutdown()
+    with pytest.raises(RuntimeError):
+        s.submit(int)
+
+
+def test_set_scheduler(mocker):
+    mocker.patch("bottica.scheduler._scheduler", None)
+    s = scheduler.DNSScheduler()
+    scheduler.set_scheduler(s)
+    assert scheduler.get_scheduler() is s
+
+
+def test_cancelled_skipped(blocked):
+    s, release = blocked
+    cancelled = [s.submit(int) for _ in range(5)]
+    future = s.submit(int, "5")
+    for f in cancelled:
+        f.cancel()
+    release.set()
+
+    assert future.result() == 5
+    assert s.stats() == {"queued": {}, "in_flight": 0, "completed": 2}
+
+
+def test_cancelled_dont_take_rate_limit_slots():
+    s = scheduler.DNSScheduler(max_concurrency=1, max_qps=20)
+    release = threading.Event()
+    s.submit(release.wait)
+    cancelled = [s.submit(int) for _ in range(10)]
+    future = s.submit(int)
+    for f in cancelled:
+        f.cancel()
+
+    start = time.monotonic()
+    release.set()
+    future.result()
+    s.shutdown()
+
+    # One slot after the blocking lookup, rather than eleven
+    assert time.monotonic() - start < 0.25
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+def test_lookups_after_fork(mocker):
+    # With all of its threads started, a scheduler inherited from the
+    # parent would never start a thread in the child
+    mocker.patch("bottica.scheduler._scheduler", None)
+    scheduler.set_scheduler(scheduler.DNSScheduler(max_concurrency=1))
+    assert scheduler.get_scheduler().submit(int, "1").result() == 1
+
+    pid = os.fork()
+    if pid == 0:
+        ok = False
+        try:
+            ok = scheduler.get_scheduler().submit(int, "2").result(timeout=5) == 2
+        finally:
+            os._exit(0 if ok else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+
+
+def test_cancelled_not_counted_as_queued(blocked):
+    s, release = blocked
+    futures = [s.submit(int), s.submit(int), s.submit(int)]
+    futures[0].cancel()
+    futures[2].cancel()
+
+    assert s.queue_depth() == 1
+    assert s.stats()["queued"] == {scheduler.PRIORITY_INTERACTIVE: 1}
+    release.set()
+    futures[1].result()
+    assert s.queue_depth() == 0
+
+
+def test_fork_detected_without_hook():
+    # Emulate a child process on Python < 3.7: the lock may be held by a
+    # thread that's gone, and all of the threads are gone
+    s = scheduler.DNSScheduler(max_concurrency=1)
+    s.submit(int).result()
+    s._cond.acquire()
+    s._pid = -1
+
+    assert s.submit(int, "2").result(timeout=5) == 2
+    s.shutdown()
@@ -0,0 +1,155 @@
+import pickle
+import socket
+
+from bottica import bottica, spoofers
+
+
+def test_bloom_filter():
+    bloom = spoofers._BloomFilter(capacity=100, error_rate=0.01)
+    bloom.add(b"a")
+    assert b"a" in bloom
+    assert b"b" not in bloom
+    assert bloom.count == 1
+
+
+class TestSpooferTracker:
+    def test_record(self, clock):
+        tracker = spoofers.SpooferTracker(clock=clock)
+        tracker.record("1.2.3.4", "Googlebot")
+
+        assert tracker.is_spoofer("1.2.3.4")
+        assert not tracker.is_spoofer("2.3.4.5")
+        assert tracker.recent() == {"1.2.3.4": "Googlebot"}
+
+    def test_bloom_remembers_evicted(self, clock):
+        tracker = spoofers.SpooferTracker(max_recent=1, clock=clock)
+        tracker.record("1.2.3.4")
+        tracker.record("2001:db8::1")
+
+        assert list(tracker.recent()) == ["2001:db8::1"]
+        assert tracker.is_spoofer("1.2.3.4")
+
+    def test_expires(self, clock):
+        tracker = spoofers.SpooferTracker(ttl=100, clock=clock)
+        tracker.record("1.2.3.4")
+
+        clock.now = 49
+        assert tracker.is_spoofer("1.2.3.4")
+        clock.now = 60
+        assert tracker.is_spoofer("1.2.3.4")
+        clock.now = 101
+        assert not tracker.is_spoofer("1.2.3.4")
+        assert tracker.recent() == {}
+
+    def test_rotates_at_capacity(self, clock):
+        tracker = spoofers.SpooferTracker(capacity=2, max_recent=1, clock=clock)
+        for i in range(5):
+            tracker.record(f"10.0.0.{i}")
+
+        assert len(tracker._filters) == 2
+        assert not tracker.is_spoofer("10.0.0.0")
+        assert tracker.is_spoofer("10.0.0.4")
+
+    def test_networks_aggregated(self, clock):
+        tracker = spoofers.SpooferTracker(clock=clock)
+        for ip in ["10.0.0.0", "10.0.0.1", "10.0.1.7", "2001:db8::1"]:
+            tracker.record(ip)
+
+        assert [str(n) for n in tracker.networks()] == [
+            "10.0.0.0/31",
+            "10.0.1.7/32",
+            "2001:db8::1/128",
+        ]
+        assert [str(n) for n in tracker.networks(23, 48)] == [
+            "10.0.0.0/23",
+            "2001:db8::/48",
+        ]
+
+    def test_export_ipset(self, clock):
+        tracker = spoofers.SpooferTracker(clock=clock)
+        tracker.record("1.2.3.4")
+        tracker.record("2001:db8::1")
+
+        assert tracker.export_ipset("spoofers").splitlines() == [
+            "create spoofers hash:net family inet -exist",
+            "create spoofers-tmp hash:net family inet -exist",
+            "flush spoofers-tmp",
+            "create spoofers-v6 hash:net family inet6 -exist",
+            "create spoofers-v6-tmp hash:net family inet6 -exist",
+            "flush spoofers-v6-tmp",
+            "add spoofers-tmp 1.2.3.4/32 -exist",
+            "add spoofers-v6-tmp 2001:db8::1/128 -exist",
+            "swap spoofers-tmp spoofers",
+            "destroy spoofers-tmp",
+            "swap spoofers-v6-tmp spoofers-v6",
+            "destroy spoofers-v6-tmp",
+        ]
+
+    def test_export_nftables(self, clock):
+        tracker = spoofers.SpooferTracker(clock=clock)
+        tracker.record("1.2.3.4")
+        tracker.record("1.2.3.5")
+
+        assert tracker.export_nftables(prefixlen_v4=24).splitlines() == [
+            "add set inet filter bottica-spoofers-v4 { type ipv4_addr; flags interval; }",
+            "flush set inet filter bottica-spoofers-v4",
+            "add element inet filter bottica-spoofers-v4 { 1.2.3.0/24 }",
+            "add set inet filter bottica-spoofers-v6 { type ipv6_addr; flags interval; }",
+            "flush set inet filter bottica-spoofers-v6",
+        ]
+
+    def test_invalid_ip(self, clock):
+        tracker = spoofers.SpooferTracker(clock=clock)
+        tracker.record("-")
+        assert not tracker.is_spoofer("-")
+        assert not tracker.is_spoofer("1.2.3.4, 5.6.7.8")
+        assert tracker.recent() == {}
+
+    def test_pickle(self, clock):
+        tracker = spoofers.SpooferTracker(clock=clock)
+        tracker.record("1.2.3.4", "Googlebot")
+
+        restored = pickle.loads(pickle.dumps(tracker))
+
+        assert restored.is_spoofer("1.2.3.4")
+        restored.record("2.3.4.5")
+        assert restored.is_spoofer("2.3.4.5")
+
+
+class TestBotticaSpoofers:
+    def test_failed_verification_recorded(self):
+        tracker = spoofers.SpooferTracker()
+        b = bottica.Bottica(yaml_path=None, spoofers=tracker)
+        b.verifiers["Googlebot"] = {"ip_list": ["1.2.3.4"]}
+
+        assert b.verify_bot("1.2.3.4", "Googlebot")
+        assert not b.verify_bot("2.3.4.5", "Googlebot")
+        assert tracker.recent() == {"2.3.4.5": "Googlebot"}
+
+    def test_known_spoofer_skips_verification(self, mocker):
+        tracker = spoofers.SpooferTracker()
+        tracker.record("2.3.4.5")
+        b = bottica.Bottica(yaml_path=None, spoofers=tracker)
+        b.verifiers["Googlebot"] = {"ip_list": ["1.2.3.4"]}
+        verify = mocker.spy(b, "verify")
+        is_spoofer = mocker.spy(tracker, "is_spoofer")
+
+        assert not b.verify_ua("2.3.4.5", "Googlebot/2.1")
+        assert not verify.called
+        assert is_spoofer.call_count == 1
+
+    def test_invalid_ip_same_as_without_tracker(self, mocker):
+        mocker.patch(
+            "socket.gethostbyaddr",
+            side_effect=socket.herror(1, "Unknown host"),
+        )
+        with_tracker = bottica.Bottica(
+            yaml_path=None, spoofers=spoofers.SpooferTracker()
+        )
+        without_tracker = bottica.Bottica(yaml_path=None)
+        for b in (with_tracker, without_tracker):
+            b.verifiers["Googlebot"] = {"fcrdns_hosts": ["googlebot.com"]}
+
+        assert not with_tracker.verify_bot("-", "Googlebot")
+        assert not without_tracker.verify_bot("-", "Googlebot")
+        assert with_tracker.spoofers.recent() == {}
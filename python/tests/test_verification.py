@@ -29,46 +29,135 @@ def test_gethostbyaddr_retries(mocker):
 
 
 def test_fcrdns_hosts_host_not_found(mocker):
-    mocker.patch("bottica.verification.get_hostname_by_ip", return_value=None)
+    mocker.patch("bottica.verification.get_hostnames_by_ip", return_value=None)
     verified = verification.fcrdns_hosts("1.2.3.4")
     assert not verified
 
 
 def test_fcrdns_hosts_ip_not_found(mocker):
-    mocker.patch("bottica.verification.get_hostname_by_ip", return_value="google.com")
-    mocker.patch("bottica.verification.get_ips_by_hostname", return_value=None)
+    mocker.patch(
+        "bottica.verification.get_hostnames_by_ip", return_value=["google.com"]
+    )
+    mocker.patch("bottica.verification._getaddrinfo", return_value=[])
     verified = verification.fcrdns_hosts("1.2.3.4")
     assert not verified
 
 
 def test_fcrdns_ip_not_match(mocker):
-    mocker.patch("bottica.verification.get_hostname_by_ip", return_value="google.com")
-    mocker.patch("bottica.verification.get_ips_by_hostname", return_value=["2.3.4.5"])
+    mocker.patch(
+        "bottica.verification.get_hostnames_by_ip", return_value=["google.com"]
+    )
+    mocker.patch("bottica.verification._getaddrinfo", return_value=["2.3.4.5"])
     verified = verification.fcrdns_hosts("1.2.3.4")
     assert not verified
 
 
 def test_fcrdns_host_not_in_list(mocker):
-    mocker.patch("bottica.verification.get_hostname_by_ip", return_value="google.com")
-    mocker.patch("bottica.verification.get_ips_by_hostname", return_value="1.2.3.4")
+    mocker.patch(
+        "bottica.verification.get_hostnames_by_ip", return_value=["google.com"]
+    )
+    mocker.patch("bottica.verification._getaddrinfo", return_value=["1.2.3.4"])
     verified = verification.fcrdns_hosts("1.2.3.4", allowed_hosts=["bing.com"])
     assert not verified
 
 
 def test_fcrdns_host_in_list(mocker):
-    mocker.patch("bottica.verification.get_hostname_by_ip", return_value="google.com")
-    mocker.patch("bottica.verification.get_ips_by_hostname", return_value="1.2.3.4")
+    mocker.patch(
+        "bottica.verification.get_hostnames_by_ip", return_value=["google.com"]
+    )
+    mocker.patch("bottica.verification._getaddrinfo", return_value=["1.2.3.4"])
     verified = verification.fcrdns_hosts("1.2.3.4", allowed_hosts=["google.com"])
     assert verified
 
 
 def test_fcrdns_any_host(mocker):
-    mocker.patch("bottica.verification.get_hostname_by_ip", return_value="google.com")
-    mocker.patch("bottica.verification.get_ips_by_hostname", return_value="1.2.3.4")
+    mocker.patch(
+        "bottica.verification.get_hostnames_by_ip", return_value=["google.com"]
+    )
+    mocker.patch("bottica.verification._getaddrinfo", return_value=["1.2.3.4"])
     verified = verification.fcrdns_hosts("1.2.3.4")
     assert verified
 
 
+def test_getaddrinfo_no_data(mocker):
+    def raise_no_data(*_):
+        raise socket.gaierror(socket.EAI_NONAME, "No address")
+
+    mocker.patch("socket.getaddrinfo", side_effect=raise_no_data)
+    assert verification._getaddrinfo("google.com", socket.AF_INET6) == []
+
+
+def test_get_ips_by_hostname_v4_and_v6(mocker):
+    def getaddrinfo(host, port, family, *_):
+        if family == socket.AF_INET:
+            return [(family, None, None, "", ("1.2.3.4", 0))]
+        return [(family, None, None, "", ("2001:DB8::0:1", 0, 0, 0))]
+
+    mocker.patch("socket.getaddrinfo", side_effect=getaddrinfo)
+    ips = verification.get_ips_by_hostname("google.com")
+    assert ips == ["1.2.3.4", "2001:db8::1"]
+
+
+def test_get_ips_by_hostname_not_found(mocker):
+    mocker.patch("bottica.verification._getaddrinfo", return_value=[])
+    assert verification.get_ips_by_hostname("google.com") is None
+
+
+def test_get_hostnames_by_ip_aliases(mocker):
+    mocker.patch(
+        "socket.gethostbyaddr",
+        return_value=("a.google.com", ["b.google.com"], ["1.2.3.4"]),
+    )
+    names = verification.get_hostnames_by_ip("1.2.3.4")
+    assert names == ["a.google.com", "b.google.com"]
+
+
+def test_fcrdns_ipv6_normalized(mocker):
+    mocker.patch(
+        "bottica.verification.get_hostnames_by_ip", return_value=["google.com"]
+    )
+    mocker.patch("bottica.verification._getaddrinfo", return_value=["2001:db8::1"])
+    verified = verification.fcrdns_hosts("2001:DB8:0::1")
+    assert verified
+
+
+def test_fcrdns_checks_all_aliases(mocker):
+    mocker.patch(
+        "bottica.verification.get_hostnames_by_ip",
+        return_value=["example.com", "a.google.com", "b.google.com"],
+    )
+
+    def getaddrinfo(hostname, family, max_tries):
+        if hostname == "b.google.com" and family == socket.AF_INET:
+            return ["1.2.3.4"]
+        return []
+
+    mock = mocker.patch("bottica.verification._getaddrinfo", side_effect=getaddrinfo)
+    verified = verification.fcrdns_hosts("1.2.3.4", allowed_hosts=["google.com"])
+
+    assert verified
+    looked_up = {args[0] for args, _ in mock.call_args_list}
+    assert "example.com" not in looked_up
+
+
+def test_fcrdns_aaaa_failure_doesnt_mask_a_match(mocker):
+    mocker.patch(
+        "bottica.verification.get_hostnames_by_ip",
+        return_value=["crawl.googlebot.com"],
+    )
+
+    def getaddrinfo(hostname, family, max_tries):
+        if family == socket.AF_INET6:
+            raise socket.gaierror(socket.EAI_FAIL, "SERVFAIL")
+        return ["1.2.3.4"]
+
+    mocker.patch("bottica.verification._getaddrinfo", side_effect=getaddrinfo)
+
+    assert verification.fcrdns_hosts("1.2.3.4", allowed_hosts=["googlebot.com"])
+    with pytest.raises(socket.gaierror):
+        verification.fcrdns_hosts("2.3.4.5", allowed_hosts=["googlebot.com"])
+
+
 @pytest.mark.parametrize(
     "ip, ip_list, verified",
     [